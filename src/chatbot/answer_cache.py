@@ -0,0 +1,138 @@
+"""Cache of LLM answers in front of the RAG chain.
+
+Entries are keyed by the normalized query plus the analyzed intent and entities,
+so "Show me vegetarian options" and "show me  vegetarian options?" share an answer
+while the same words about another restaurant do not. Entries expire after
+`ttl_seconds` and as soon as the KG is rebuilt (its build version changes).
+
+With `semantic_threshold` set, a miss falls back to the most similar cached query
+with the same intent and entities, reusing its answer when the cosine similarity
+of the two query embeddings reaches the threshold.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Container, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from src.knowledge_base.query_cache import normalize_query
+from src.retrieval.query_analyzer import QueryAnalysis
+
+AnswerKey = Tuple[Optional[str], ...]
+
+
+def _unit(vector: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    if vector is None:
+        return None
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+class _Entry(NamedTuple):
+    answer: str
+    version: str
+    created: float
+    llm_seconds: float
+    vector: Optional[np.ndarray]
+
+
+class AnswerCache:
+    """Bounded, thread-safe LRU of answers with a TTL and an optional near-duplicate tier."""
+
+    def __init__(self, max_size: int = 512, ttl_seconds: float = 3600.0, semantic_threshold: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._entries: "OrderedDict[AnswerKey, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(query: str, analysis: QueryAnalysis, restaurants: Container[str]) -> AnswerKey:
+        """Key from the normalized query and the resolved entities; an extracted restaurant only
+        counts when it is one of `restaurants` (unresolved capitalized phrases are just query text)."""
+        return (
+            normalize_query(query).rstrip('?!. '),
+            analysis.intent,
+            analysis.restaurant if analysis.restaurant in restaurants else None,
+            analysis.section,
+            analysis.location,
+            analysis.dietary
+        )
+
+    def _expired(self, entry: _Entry, version: str, now: float) -> bool:
+        return entry.version != version or (self.ttl_seconds > 0 and now - entry.created > self.ttl_seconds)
+
+    def _hit(self, key: AnswerKey, entry: _Entry) -> str:
+        self._entries.move_to_end(key)
+        self.saved_seconds += entry.llm_seconds
+        return entry.answer
+
+    def get(self, key: AnswerKey, version: str, vector: Optional[np.ndarray] = None) -> Optional[str]:
+        """Cached answer for the key, else (with a vector) for the closest same-scope query, else None."""
+        now = time.time()
+        vector = _unit(vector)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry, version, now):
+                    self.hits += 1
+                    return self._hit(key, entry)
+                del self._entries[key]
+            if vector is not None and self.semantic_threshold is not None:
+                match = self._nearest(key, version, vector, now)
+                if match is not None:
+                    self.semantic_hits += 1
+                    return self._hit(match, self._entries[match])
+            self.misses += 1
+            return None
+
+    def _nearest(self, key: AnswerKey, version: str, vector: np.ndarray, now: float) -> Optional[AnswerKey]:
+        """Key of the most similar live entry with the same intent and entities, if within the threshold."""
+        candidates = [
+            other for other, entry in self._entries.items()
+            if other[1:] == key[1:] and entry.vector is not None and not self._expired(entry, version, now)
+        ]
+        if not candidates:
+            return None
+        similarities = np.stack([self._entries[other].vector for other in candidates]) @ vector
+        best = int(np.argmax(similarities))
+        return candidates[best] if similarities[best] >= self.semantic_threshold else None
+
+    def put(self, key: AnswerKey, version: str, answer: str, llm_seconds: float, vector: Optional[np.ndarray] = None):
+        if self.max_size <= 0:
+            return
+        vector = _unit(vector)
+        with self._lock:
+            self._entries[key] = _Entry(answer, version, time.time(), llm_seconds, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.semantic_hits = 0
+            self.misses = 0
+            self.saved_seconds = 0.0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.semantic_hits + self.misses
+            return {
+                'hits': self.hits,
+                'semantic_hits': self.semantic_hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hit_rate': (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+                'saved_llm_seconds': self.saved_seconds
+            }
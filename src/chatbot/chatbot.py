@@ -1,6 +1,12 @@
+import asyncio
 import os
-import re
-from typing import Tuple
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
 
 from langchain_groq import ChatGroq
 from langchain.chains import RetrievalQA
@@ -8,10 +14,26 @@ from langchain.chains import RetrievalQA
 # Use absolute imports
 from src.knowledge_base.kg_builder import RestaurantKG
 from src.retrieval.kg_retriever import KGRetriever
+from src.retrieval.query_analyzer import QueryAnalysis, QueryAnalyzer
+from src.chatbot.answer_cache import AnswerCache, AnswerKey
 from src.chatbot.prompts import CUSTOM_RAG_PROMPT 
 from src.utils.text_utils import normalize_name
+RAG_INTENTS = ('availability_rag', 'general_rag')
+COMPARE_QUESTION = (
+    "Compare the following two restaurants based on their menu, price range, and variety. "
+    "Highlight unique items and similarities."
+)
+
+
 class RestaurantChatbot:
-    def __init__(self, kg: RestaurantKG):
+    def __init__(
+        self,
+        kg: RestaurantKG,
+        answer_cache: Optional[Dict] = None,
+        llm_concurrency: int = 8,
+        kg_workers: int = 4,
+        context_token_budget: int = 1500
+    ):
         self.kg = kg
         self.history = [] 
         try:
@@ -26,7 +48,11 @@ class RestaurantChatbot:
             # Decide if the app should stop or try to continue without LLM for some queries
             raise ValueError("Could not initialize LLM.") from e
 
-        self.retriever = KGRetriever(kg=self.kg, k=5)
+        # One analyzer for routing and retrieval, so each message is parsed once.
+        self.analyzer = QueryAnalyzer(self.kg)
+        self.retriever = KGRetriever(
+            kg=self.kg, k=5, analyzer=self.analyzer, context_token_budget=context_token_budget
+        )
         self.rag_chain = RetrievalQA.from_chain_type(
             llm=self.llm,
             chain_type="stuff", 
@@ -35,95 +61,327 @@ class RestaurantChatbot:
             return_source_documents=False 
         )
         print("LangChain RAG chain initialized.")
+        # RAG answers are reused for repeated questions until the KG is rebuilt; see config.yaml `answer_cache`.
+        self.answer_cache = AnswerCache(**(answer_cache or {}))
+        # Async API: KG lookups run on this pool. LLM calls (sync and async, from any thread or event
+        # loop) share one process-wide cap; each loop queues on its own semaphore first.
+        self.executor = ThreadPoolExecutor(max_workers=kg_workers, thread_name_prefix="kg")
+        self.llm_concurrency = llm_concurrency
+        self._llm_cap = threading.BoundedSemaphore(llm_concurrency)
+        self._llm_waiters = ThreadPoolExecutor(max_workers=llm_concurrency, thread_name_prefix="llm-slot")
+        self._llm_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
 
     def _handle_query_type(self, query: str) -> str:
         """Determine the type of query to decide the handling strategy."""
-        q = query.lower()
-        if 'compare' in q and 'menus' in q and 'and' in q:
-            return 'desc_compare'
-        if 'vegetarian' in q and ('best' in q or 'most' in q):
-            return 'veg_comparison'
-        # Price range needs careful extraction
-        if 'price' in q and 'range' in q and ('for' in q or 'of' in q or 'at' in q):
-
-            if self._extract_restaurant_and_section(query)[0]:
-                 return 'price_range'
-        if 'gluten' in q and ('have' in q or 'offer' in q or 'any' in q or 'at' in q or 'in' in q):
-             if self._extract_restaurant_and_section(query)[0]:
-                  return 'gluten_free_specific'
-             else:
-                  return 'gluten_free_general' 
-        if 'gluten' in q: 
-            return 'gluten_free_general'
-
-    
-        if 'what' in q and ('offer' in q or 'have' in q or 'serve' in q) and \
-           ('appetizers' in q or 'desserts' in q or 'dishes' in q or 'items' in q):
-             return 'availability_rag' 
-
-        # Default to general RAG handling
-        return 'general_rag'
-
-    def _extract_restaurants_and_keyword(self, query: str) -> Tuple[str | None, str | None, str | None]:
-        """Extract restaurant names and keyword from comparison queries."""
-        rest_matches = re.findall(r'menus? of ([\w\s&]+) and ([\w\s&]+)', query, re.IGNORECASE)
-        keyword = None
-        m = re.search(r'compare the ([\w\s]+) mentioned', query, re.IGNORECASE)
-        if m:
-            phrase = m.group(1).strip()
-            words = phrase.split()
-            keyword = words[-1]
-            if keyword in ['levels', 'options']: keyword = words[-2]
-            if keyword == 'dishes' and len(words) > 1: keyword = words[-2]
-            if keyword in ['the', 'a', 'an']: keyword = words[-2] if len(words) > 1 else None
-        if not keyword and 'spice' in query.lower(): keyword = 'spice'
-        if not keyword:
-             m = re.search(r'([a-zA-Z0-9\-]+) (?:dishes|mentioned)', query, re.IGNORECASE)
-             if m: keyword = m.group(1)
-
-        if rest_matches and keyword:
-            rest1, rest2 = rest_matches[0]
-            return rest1.strip(), rest2.strip(), keyword.lower()
-        elif rest_matches:
-             print("Warning: Found restaurants for comparison but couldn't extract keyword.")
-             rest1, rest2 = rest_matches[0]
-             return rest1.strip(), rest2.strip(), None
-        return None, None, keyword.lower() if keyword else None
-
-    def _extract_restaurant_and_section(self, query: str) -> Tuple[str | None, str | None]:
-         """Extract restaurant and optional section for price/gluten queries."""
-         q_lower = query.lower()
-         patterns = [
-              r'(?:price range|gluten-free)\s+(?:for|at|in)\s+([\w\s\-&]+?)(?:\'s)?(?:\s+([\w\s]+?))?\s*(?:menu)?$',
-              r'(?:gluten-free|price range)\s+([\w\s]+?)\s+(?:at|for)\s+([\w\s\-&]+)$'
-         ]
-         for i, pattern in enumerate(patterns):
-              match = re.search(pattern, q_lower)
-              if match:
-                   groups = match.groups()
-                   if i == 0:
-                        rest = groups[0].strip() if groups[0] else None
-                        sect = groups[1].strip() if groups[1] else None
-                        return rest, sect
-                   elif i == 1:
-                        sect = groups[0].strip() if groups[0] else None
-                        rest = groups[1].strip() if groups[1] else None
-                        if sect and len(sect.split()) > 1 and any(w.istitle() for w in sect.split()):
-                             rest, sect = sect, rest
-                        return rest, sect
-
-         potential_rests = re.findall(r'\b[A-Z][\w\s\-&\'\.]+\b', query)
-         if potential_rests:
-              longest_rest = max(potential_rests, key=len).strip()
-              section_match = re.search(rf'{re.escape(longest_rest)}\s+(dessert|appetizer|main|drink|starter)s?', query, re.IGNORECASE)
-              section = section_match.group(1) if section_match else None
-              return longest_rest, section
-         return None, None
+        return self.analyzer.analyze(query).intent
+
+    def answer_price_query(self, analysis: QueryAnalysis) -> str:
+        """Answer "cheapest ..." / "under ₹200" questions straight from the KG facet index (no LLM call)."""
+        pq = analysis.price_query
+        items = pq.items if pq.items is not None else self.kg.query_items(
+            restaurant_name=analysis.restaurant,
+            location=pq.location,
+            dietary=pq.dietary,
+            min_price=pq.min_price,
+            max_price=pq.max_price,
+            keyword=pq.keyword,
+            sort=pq.sort,
+            limit=pq.limit
+        )
+        description = f"{pq.dietary} items" if pq.dietary else "items"
+        if pq.keyword: description += f" matching '{pq.keyword}'"
+        if analysis.restaurant: description += f" at {analysis.restaurant}"
+        if pq.location: description += f" in {pq.location}"
+        if pq.min_price is not None: description += f" from ₹{pq.min_price:.0f}"
+        if pq.max_price is not None: description += f" up to ₹{pq.max_price:.0f}"
+        if not items:
+            return f"No {description} found."
+        order = "Most expensive" if pq.sort == 'price_desc' else "Cheapest"
+        answer = f"{order} {description}:\n"
+        for item in items: answer += f"• {item['name']} at {item['restaurant_name']} (₹{item['price']:.0f})\n"
+        return answer
+
+    @staticmethod
+    def _gluten_free_listing(items: List[Dict], restaurant: Optional[str]) -> str:
+        """Up to 7 items for one restaurant, or 2 items each for up to 4 restaurants."""
+        if restaurant:
+            lines = [f"• {item['name']} (₹{item['price']:.0f})" for item in items[:7]]
+            if len(items) > 7: lines.append(f"... and {len(items) - 7} more.")
+            return "\n".join(lines)
+        by_rest = {}
+        for item in items:
+            names = by_rest.setdefault(item['restaurant_name'], [])
+            if len(names) < 2: names.append(f"{item['name']} (₹{item['price']:.0f})")
+        text = "\n".join(f"{rest}:\n" + "\n".join(f"• {i}" for i in names) for rest, names in list(by_rest.items())[:4])
+        return text + ("\n... and potentially more." if len(by_rest) > 4 else "")
+
+    def gluten_free_answer(self, restaurant: Optional[str] = None, section: Optional[str] = None) -> str:
+        """Items stated gluten-free, then items only inferred to be, the latter always with a caveat."""
+        stated = self.kg.get_gluten_free_items(restaurant, section)
+        likely = self.kg.get_likely_gluten_free_items(restaurant, section)
+        scope = f"{f'in {section} ' if section else ''}at '{restaurant}'" if restaurant else "across restaurants"
+        if not stated and not likely:
+            return f"No gluten-free options found {scope} based on descriptions. (Check common ingredients.)"
+
+        parts = []
+        if stated:
+            parts.append(f"Gluten-free options {scope} (stated on the menu):\n{self._gluten_free_listing(stated, restaurant)}")
+        if likely:
+            parts.append(
+                f"Likely gluten-free {scope} (rice, lentil or dairy based with no wheat listed; "
+                f"inferred, not confirmed by the restaurant):\n{self._gluten_free_listing(likely, restaurant)}"
+            )
+        return "\n\n".join(parts) + "\n\n(Note: Cross-contamination is possible; verify with the restaurant for strict needs.)"
+
+    @staticmethod
+    def _is_unhelpful(answer: str) -> bool:
+        """Check for unhelpful RAG responses."""
+        return not answer or \
+           'don\'t know' in answer.lower() or \
+           'cannot answer' in answer.lower() or \
+           'outside the scope' in answer.lower() or \
+           'not available in the provided details' in answer.lower() or \
+           len(answer) < 20
+
+    def _kg_fallback(self, query: str) -> str:
+        """Simple KG search used when the LLM has nothing useful."""
+        kg_results = self.kg.search(query, k=3)
+        if kg_results:
+             fallback_answer = "Based on keywords, found related items:\n"
+             for item in kg_results: fallback_answer += f"• At {item['restaurant_name']}: {item['name']} (₹{item['price']:.0f})\n"
+             return fallback_answer
+        return "Information not found for your query." # Keep it concise
+
+    def _answer_rag(self, query: str) -> str:
+        """Answer through the RAG chain, falling back to a plain KG search when the LLM has nothing useful."""
+        with self._llm_cap:
+            result = self.rag_chain.invoke({"query": query})
+        answer = result.get("result", "").strip()
+        return self._kg_fallback(query) if self._is_unhelpful(answer) else answer
+
+    def _cached_answer(self, query: str, analysis: QueryAnalysis) -> Tuple[AnswerKey, Optional[np.ndarray], Optional[str]]:
+        """(cache key, query vector for the semantic tier, cached answer or None) for a RAG question."""
+        key = self.answer_cache.make_key(query, analysis, self.kg.restaurant_stats)
+        vector = self.kg.embed_query(query) if self.answer_cache.semantic_threshold is not None else None
+        cached = self.answer_cache.get(key, self.kg.build_version, vector)
+        if cached is not None:
+            print(f"DEBUG: Answer cache hit for query type '{analysis.intent}'")
+        return key, vector, cached
+
+    def ask_with_context(self, question: str, context: str) -> str:
+        """Answer from caller-built context with CUSTOM_RAG_PROMPT, skipping routing and retrieval."""
+        with self._llm_cap:
+            message = self.llm.invoke(CUSTOM_RAG_PROMPT.format(context=context, question=question))
+        return message.content.strip()
+
+    async def aask_with_context(self, question: str, context: str) -> str:
+        """Async `ask_with_context`, counted against the per-process LLM limit."""
+        return await self._allm(CUSTOM_RAG_PROMPT.format(context=context, question=question))
+
+    @staticmethod
+    def _rag_prompt(query: str, docs) -> str:
+        """Same prompt as the "stuff" RetrievalQA chain: retrieved documents joined into the context."""
+        return CUSTOM_RAG_PROMPT.format(context="\n\n".join(doc.page_content for doc in docs), question=query)
+
+    def ask_stream(self, query: str) -> Iterator[str]:
+        """Like `ask`, but yields the answer in pieces: RAG answers token by token as the LLM
+        produces them; structured KG answers and cached answers in one piece right away."""
+        analysis = self.analyzer.analyze(query)
+        if analysis.intent not in RAG_INTENTS:
+            yield self.ask(query)
+            return
+        self.history.append({"role": "user", "content": query})
+        key, vector, cached = self._cached_answer(query, analysis)
+        if cached is not None:
+            yield cached
+            return
+        print(f"DEBUG: Streaming RAG answer for query type '{analysis.intent}'")
+        start = time.perf_counter()
+        parts = []
+        try:
+            prompt = self._rag_prompt(query, self.retriever.invoke(query))
+            with self._llm_cap:
+                for chunk in self.llm.stream(prompt):
+                    if chunk.content:
+                        parts.append(chunk.content)
+                        yield chunk.content
+        except Exception as e:
+            print(f"Error streaming RAG answer: {e}")
+            yield f"Error processing request: {str(e)[:100]}"
+            return
+        answer = "".join(parts).strip()
+        if self._is_unhelpful(answer):
+            answer = self._kg_fallback(query)
+            yield f"\n\n{answer}" if parts else answer
+        self.answer_cache.put(key, self.kg.build_version, answer, time.perf_counter() - start, vector)
+
+    def answer_cache_stats(self) -> Dict[str, float]:
+        return self.answer_cache.stats()
+
+    def _comparison_menu(self, name: Optional[str]) -> Tuple[Optional[str], List[Dict]]:
+        """Normalized KG name and menu items of one restaurant in a comparison."""
+        if not name:
+            return None, []
+        norm = normalize_name(self.kg.name_resolver.best(name) or name)
+        return norm, self.kg.get_menu_items_for_restaurant(norm)
+
+    @staticmethod
+    def _missing_comparison_data(rest1, rest2, items1: List[Dict], items2: List[Dict]) -> Optional[str]:
+        if not items1 and not items2:
+            return f"Sorry, I couldn't find data for either '{rest1}' or '{rest2}'."
+        if not items1:
+            return f"Sorry, I couldn't find data for '{rest1}'."
+        if not items2:
+            return f"Sorry, I couldn't find data for '{rest2}'."
+        return None
+
+    @staticmethod
+    def comparison_context(rest1: str, rest2: str, context1: str, context2: str) -> str:
+        """Context block for COMPARE_QUESTION from two menus already formatted one item per line."""
+        return f"{rest1.title()} Menu:\n{context1}\n\n{rest2.title()} Menu:\n{context2}\n"
+
+    @classmethod
+    def _comparison_items_context(cls, rest1: str, rest2: str, items1: List[Dict], items2: List[Dict]) -> str:
+        context1 = "\n".join(
+            f"{e['name']} ({e['section']}, ₹{e['price']:.0f})"
+            for e in items1[:30]
+        )
+        context2 = "\n".join(
+            f"{e['name']} ({e['section']}, ₹{e['price']:.0f})"
+            for e in items2[:30]
+        )
+        return cls.comparison_context(rest1, rest2, context1, context2)
+
+    def _structured_comparison(self, rest1: str, rest2: str, norm1: str, norm2: str, items1: List[Dict], items2: List[Dict]) -> str:
+        # Structured fallback from the precomputed restaurant stats
+        stats1 = self.kg.get_restaurant_stats(norm1)
+        stats2 = self.kg.get_restaurant_stats(norm2)
+        menu_size1, menu_size2 = stats1['items'], stats2['items']
+        veg1, veg2 = stats1['veg'], stats2['veg']
+        nonveg1, nonveg2 = stats1['non_veg'], stats2['non_veg']
+        price_range1 = f"₹{stats1['min_price']:.0f} - ₹{stats1['max_price']:.0f}" if stats1['min_price'] is not None else "N/A"
+        price_range2 = f"₹{stats2['min_price']:.0f} - ₹{stats2['max_price']:.0f}" if stats2['min_price'] is not None else "N/A"
+        section1 = stats1['sections'][:3]
+        section2 = stats2['sections'][:3]
+        ex_items1 = ", ".join([e['name'] for e in items1[:3]])
+        ex_items2 = ", ".join([e['name'] for e in items2[:3]])
+        names1 = set(e['name'].lower() for e in items1)
+        names2 = set(e['name'].lower() for e in items2)
+        common_dishes = names1 & names2
+        common_dishes_str = ", ".join(dish.title() for dish in list(common_dishes)[:5]) if common_dishes else "None"
+        answer = (
+            f"**Comparison between {rest1.title()} and {rest2.title()}:**\n\n"
+            f"**Menu Size:**\n"
+            f"- {rest1.title()}: {menu_size1} items\n"
+            f"- {rest2.title()}: {menu_size2} items\n\n"
+            f"**Veg/Non-Veg Count:**\n"
+            f"- {rest1.title()}: {veg1} veg, {nonveg1} non-veg\n"
+            f"- {rest2.title()}: {veg2} veg, {nonveg2} non-veg\n\n"
+            f"**Price Range:**\n"
+            f"- {rest1.title()}: {price_range1}\n"
+            f"- {rest2.title()}: {price_range2}\n\n"
+            f"**Popular Sections:**\n"
+            f"- {rest1.title()}: {', '.join([s[0] for s in section1 if s[0]])}\n"
+            f"- {rest2.title()}: {', '.join([s[0] for s in section2 if s[0]])}\n\n"
+            f"**Sample Items:**\n"
+            f"- {rest1.title()}: {ex_items1}\n"
+            f"- {rest2.title()}: {ex_items2}\n\n"
+            f"**Common Dishes:** {common_dishes_str}\n"
+        )
+        return answer
+
+    async def _run(self, func, *args):
+        """Run a blocking KG call on the chatbot's thread pool."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def _llm_slots_for_loop(self) -> asyncio.Semaphore:
+        """The running loop's LLM semaphore; a semaphore is bound to the first loop that waits on it,
+        so each loop (e.g. each asyncio.run) gets its own. It only keeps a loop's extra callers off
+        the waiter threads; the process-wide limit is `_llm_cap`."""
+        loop = asyncio.get_running_loop()
+        slots = self._llm_slots.get(loop)
+        if slots is None:
+            slots = self._llm_slots[loop] = asyncio.Semaphore(self.llm_concurrency)
+        return slots
+
+    async def _acquire_llm_cap(self):
+        """Take a process-wide LLM slot; when none is free, wait on a helper thread, not the loop."""
+        if self._llm_cap.acquire(blocking=False):
+            return
+        waiter = self._llm_waiters.submit(self._llm_cap.acquire)
+        try:
+            await asyncio.wrap_future(waiter)
+        except asyncio.CancelledError:
+            # The helper thread may still get the slot after the caller gave up; hand it back.
+            waiter.add_done_callback(lambda future: future.cancelled() or self._llm_cap.release())
+            raise
+
+    async def _allm(self, prompt: str) -> str:
+        async with self._llm_slots_for_loop():
+            await self._acquire_llm_cap()
+            try:
+                message = await self.llm.ainvoke(prompt)
+            finally:
+                self._llm_cap.release()
+        return message.content.strip()
+
+    async def aask(self, query: str) -> str:
+        """Async form of `ask`: KG work runs on a thread pool and LLM calls are awaited, so one
+        process can serve many users at once (at most `llm_concurrency` LLM calls in flight)."""
+        analysis = await self._run(self.analyzer.analyze, query)
+        qtype = analysis.intent
+        if qtype == 'desc_compare':
+            self.history.append({"role": "user", "content": query})
+            return await self._acompare(analysis)
+        if qtype not in RAG_INTENTS:
+            # Structured handlers are pure KG lookups.
+            return await self._run(self.ask, query)
+        self.history.append({"role": "user", "content": query})
+        key, vector, cached = await self._run(self._cached_answer, query, analysis)
+        if cached is not None:
+            return cached
+        start = time.perf_counter()
+        try:
+            docs = await self._run(self.retriever.invoke, query)
+            answer = await self._allm(self._rag_prompt(query, docs))
+            if self._is_unhelpful(answer):
+                answer = await self._run(self._kg_fallback, query)
+        except Exception as e:
+            print(f"Error invoking RAG chain: {e}")
+            return f"Error processing request: {str(e)[:100]}"
+        self.answer_cache.put(key, self.kg.build_version, answer, time.perf_counter() - start, vector)
+        return answer
+
+    async def _acompare(self, analysis: QueryAnalysis) -> str:
+        """desc_compare with both restaurants' menus looked up concurrently."""
+        rest1, rest2 = analysis.compare_restaurants or (None, None)
+        (norm1, items1), (norm2, items2) = await asyncio.gather(
+            self._run(self._comparison_menu, rest1), self._run(self._comparison_menu, rest2)
+        )
+        missing = self._missing_comparison_data(rest1, rest2, items1, items2)
+        if missing:
+            return missing
+        try:
+            context = self._comparison_items_context(rest1, rest2, items1, items2)
+            rag_response = await self.aask_with_context(COMPARE_QUESTION, context)
+            if not rag_response or "not available" in rag_response.lower() or len(rag_response) < 20:
+                return self._structured_comparison(rest1, rest2, norm1, norm2, items1, items2)
+            return rag_response
+        except Exception as e:
+            print(f"Error invoking RAG chain for comparison: {e}")
+            return "Sorry, I couldn't generate a comparison at this time."
+
+    async def aask_many(self, queries: List[str]) -> List[str]:
+        """Answer independent messages concurrently, in input order."""
+        return list(await asyncio.gather(*(self.aask(query) for query in queries)))
 
     def ask(self, query: str) -> str:
         """Handle user query, routing to KG methods or RAG chain."""
         self.history.append({"role": "user", "content": query}) # Basic history
-        qtype = self._handle_query_type(query)
+        analysis = self.analyzer.analyze(query)
+        qtype = analysis.intent
         print(f"DEBUG: Query: '{query}' -> Type: {qtype}")
 
         # --- Structured Handlers (Direct KG Access) ---
@@ -137,143 +395,54 @@ class RestaurantChatbot:
             return answer
 
         elif qtype == 'gluten_free_specific':
-             restaurant, section = self._extract_restaurant_and_section(query)
              # We already checked restaurant exists in _handle_query_type
-             gluten_free_items = self.kg.get_gluten_free_items(restaurant, section)
-             if not gluten_free_items:
-                  return f"No specific gluten-free options found {f'in {section} ' if section else ''}at '{restaurant}' based on descriptions. (Check common ingredients)."
-             answer = f"Potentially gluten-free options {f'in {section} ' if section else ''}at '{restaurant}':\n"
-             for item in gluten_free_items[:7]: answer += f"• {item['name']} (₹{item['price']:.0f})\n"
-             if len(gluten_free_items) > 7: answer += f"... and {len(gluten_free_items) - 7} more."
-             answer += "\n(Note: Verify with restaurant for strict needs.)"
-             return answer
+             return self.gluten_free_answer(analysis.restaurant, analysis.section)
 
         elif qtype == 'gluten_free_general':
-             gluten_free_items = self.kg.get_gluten_free_items()
-             if not gluten_free_items: return "No specific gluten-free options found across restaurants based on descriptions."
-             answer = "Some potentially gluten-free options:\n"
-             by_rest = {}
-             for item in gluten_free_items:
-                  rest_name = item['restaurant_name']
-                  if rest_name not in by_rest: by_rest[rest_name] = []
-                  if len(by_rest[rest_name]) < 2: by_rest[rest_name].append(f"{item['name']} (₹{item['price']:.0f})")
-             for rest, items_list in list(by_rest.items())[:4]: answer += f"\n{rest}:\n" + "\n".join([f"• {i}" for i in items_list])
-             if len(by_rest) > 4: answer += f"\n... and potentially more."
-             answer += "\n(Note: Verify with restaurant for strict needs.)"
-             return answer
+             return self.gluten_free_answer()
 
         elif qtype == 'price_range':
-            restaurant, section = self._extract_restaurant_and_section(query)
+            restaurant, section = analysis.restaurant, analysis.section
             # We already checked restaurant exists in _handle_query_type
             return self.kg.get_price_range(restaurant, section)
 
-        elif qtype == 'desc_compare':
-            rest1, rest2, keyword = self._extract_restaurants_and_keyword(query)
-            norm1 = normalize_name(rest1) if rest1 else None
-            norm2 = normalize_name(rest2) if rest2 else None
+        elif qtype == 'price_query':
+            return self.answer_price_query(analysis)
 
+        elif qtype == 'desc_compare':
+            rest1, rest2 = analysis.compare_restaurants or (None, None)
             # Gather menu items for both
-            items1 = [e for e in self.kg.entities if e['type'] == 'MenuItem' and e['normalized_restaurant_name'] == norm1]
-            items2 = [e for e in self.kg.entities if e['type'] == 'MenuItem' and e['normalized_restaurant_name'] == norm2]
-
-            if not items1 and not items2:
-                return f"Sorry, I couldn't find data for either '{rest1}' or '{rest2}'."
-            if not items1:
-                return f"Sorry, I couldn't find data for '{rest1}'."
-            if not items2:
-                return f"Sorry, I couldn't find data for '{rest2}'."
-
-            # Build context for RAG
-            context1 = "\n".join(
-                f"{e['name']} ({e['section']}, ₹{e['price']:.0f})"
-                for e in items1[:30]
-            )
-            context2 = "\n".join(
-                f"{e['name']} ({e['section']}, ₹{e['price']:.0f})"
-                for e in items2[:30]
-            )
-            compare_prompt = (
-                f"Compare the following two restaurants based on their menu, price range, and variety. "
-                f"Highlight unique items and similarities.\n\n"
-                f"{rest1.title()} Menu:\n{context1}\n\n"
-                f"{rest2.title()} Menu:\n{context2}\n"
-            )
+            norm1, items1 = self._comparison_menu(rest1)
+            norm2, items2 = self._comparison_menu(rest2)
+            missing = self._missing_comparison_data(rest1, rest2, items1, items2)
+            if missing:
+                return missing
             try:
-                rag_response = self.rag_chain.invoke({"query": compare_prompt}).get("result", "").strip()
+                # The menus are the whole context; no retrieval pass over the synthetic prompt.
+                context = self._comparison_items_context(rest1, rest2, items1, items2)
+                rag_response = self.ask_with_context(COMPARE_QUESTION, context)
                 # If RAG fails, fallback to structured comparison
                 if not rag_response or "not available" in rag_response.lower() or len(rag_response) < 20:
-                    # Structured fallback
-                    menu_size1 = len(items1)
-                    menu_size2 = len(items2)
-                    veg1 = sum(1 for e in items1 if e['dietary'] == 'veg')
-                    veg2 = sum(1 for e in items2 if e['dietary'] == 'veg')
-                    nonveg1 = menu_size1 - veg1
-                    nonveg2 = menu_size2 - veg2
-                    prices1 = [e['price'] for e in items1 if e['price'] > 0]
-                    prices2 = [e['price'] for e in items2 if e['price'] > 0]
-                    price_range1 = f"₹{min(prices1):.0f} - ₹{max(prices1):.0f}" if prices1 else "N/A"
-                    price_range2 = f"₹{min(prices2):.0f} - ₹{max(prices2):.0f}" if prices2 else "N/A"
-                    from collections import Counter
-                    section1 = Counter([e['section'] for e in items1]).most_common(3)
-                    section2 = Counter([e['section'] for e in items2]).most_common(3)
-                    ex_items1 = ", ".join([e['name'] for e in items1[:3]])
-                    ex_items2 = ", ".join([e['name'] for e in items2[:3]])
-                    names1 = set(e['name'].lower() for e in items1)
-                    names2 = set(e['name'].lower() for e in items2)
-                    common_dishes = names1 & names2
-                    common_dishes_str = ", ".join(dish.title() for dish in list(common_dishes)[:5]) if common_dishes else "None"
-                    answer = (
-                        f"**Comparison between {rest1.title()} and {rest2.title()}:**\n\n"
-                        f"**Menu Size:**\n"
-                        f"- {rest1.title()}: {menu_size1} items\n"
-                        f"- {rest2.title()}: {menu_size2} items\n\n"
-                        f"**Veg/Non-Veg Count:**\n"
-                        f"- {rest1.title()}: {veg1} veg, {nonveg1} non-veg\n"
-                        f"- {rest2.title()}: {veg2} veg, {nonveg2} non-veg\n\n"
-                        f"**Price Range:**\n"
-                        f"- {rest1.title()}: {price_range1}\n"
-                        f"- {rest2.title()}: {price_range2}\n\n"
-                        f"**Popular Sections:**\n"
-                        f"- {rest1.title()}: {', '.join([s[0] for s in section1 if s[0]])}\n"
-                        f"- {rest2.title()}: {', '.join([s[0] for s in section2 if s[0]])}\n\n"
-                        f"**Sample Items:**\n"
-                        f"- {rest1.title()}: {ex_items1}\n"
-                        f"- {rest2.title()}: {ex_items2}\n\n"
-                        f"**Common Dishes:** {common_dishes_str}\n"
-                    )
-                    return answer
+                    return self._structured_comparison(rest1, rest2, norm1, norm2, items1, items2)
                 return rag_response
             except Exception as e:
                 print(f"Error invoking RAG chain for comparison: {e}")
                 return "Sorry, I couldn't generate a comparison at this time."
 
         # --- RAG Handler ---
-        if qtype == 'availability_rag' or qtype == 'general_rag':
+        if qtype in RAG_INTENTS:
+            key, vector, cached = self._cached_answer(query, analysis)
+            if cached is not None:
+                return cached
             print(f"DEBUG: Using RAG chain for query type '{qtype}'")
+            start = time.perf_counter()
             try:
-                result = self.rag_chain.invoke({"query": query})
-                answer = result.get("result", "").strip()
-
-                # Check for unhelpful RAG responses
-                if not answer or \
-                   'don\'t know' in answer.lower() or \
-                   'cannot answer' in answer.lower() or \
-                   'outside the scope' in answer.lower() or \
-                   'not available in the provided details' in answer.lower() or \
-                   len(answer) < 20:
-                     # Try simple KG search as fallback
-                     kg_results = self.kg.search(query, k=3)
-                     if kg_results:
-                          fallback_answer = "Based on keywords, found related items:\n"
-                          for item in kg_results: fallback_answer += f"• At {item['restaurant_name']}: {item['name']} (₹{item['price']:.0f})\n"
-                          return fallback_answer
-                     else:
-                          return "Information not found for your query." # Keep it concise
-                return answer
-
+                answer = self._answer_rag(query)
             except Exception as e:
                 print(f"Error invoking RAG chain: {e}")
                 return f"Error processing request: {str(e)[:100]}"
+            self.answer_cache.put(key, self.kg.build_version, answer, time.perf_counter() - start, vector)
+            return answer
 
         # Should not be reached
         return "Sorry, I encountered an issue handling your query."
@@ -0,0 +1,110 @@
+"""Per-group menu statistics materialized at build time.
+
+An `AggregateTable` holds, for every key of a grouping (restaurant or
+location), the item / veg / non-veg counts, the min and max positive price
+and a section histogram. It is computed once from the entity columns, saved
+in the entity store and answers stats lookups without touching the items.
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.knowledge_base.entity_store import DIETARY_VALUES, EntityStore
+
+VEG = DIETARY_VALUES.index('veg')
+NON_VEG = DIETARY_VALUES.index('non-veg')
+
+
+class AggregateTable:
+    """Stats rows keyed by group name; columns are numpy arrays, sections are CSR over string codes."""
+
+    def __init__(
+        self,
+        store: EntityStore,
+        keys: List[str],
+        counts: np.ndarray,
+        prices: np.ndarray,
+        section_offsets: np.ndarray,
+        section_codes: np.ndarray,
+        section_counts: np.ndarray
+    ):
+        self.store = store
+        self.keys = keys
+        self.rows = {key: row for row, key in enumerate(keys)}
+        self.counts = counts  # (n, 3): items, veg, non-veg
+        self.prices = prices  # (n, 2): min, max positive price; NaN when no item has a price
+        self.section_offsets = section_offsets
+        self.section_codes = section_codes
+        self.section_counts = section_counts
+
+    @classmethod
+    def build(cls, store: EntityStore, groups: Dict[str, np.ndarray]) -> "AggregateTable":
+        keys = list(groups)
+        counts = np.zeros((len(keys), 3), dtype=np.int64)
+        prices = np.full((len(keys), 2), np.nan, dtype=np.float32)
+        section_offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        section_codes, section_counts = [], []
+        for row, key in enumerate(keys):
+            positions = groups[key]
+            dietary = store.dietary[positions]
+            counts[row] = (len(positions), np.count_nonzero(dietary == VEG), np.count_nonzero(dietary == NON_VEG))
+            group_prices = store.prices[positions]
+            group_prices = group_prices[group_prices > 0]
+            if len(group_prices):
+                prices[row] = (group_prices.min(), group_prices.max())
+            # Most common first; ties keep first-appearance order, like Counter.most_common.
+            codes, first, hist = np.unique(store.string_codes['section'][positions], return_index=True, return_counts=True)
+            order = np.lexsort((first, -hist))
+            section_codes.append(codes[order])
+            section_counts.append(hist[order])
+            section_offsets[row + 1] = section_offsets[row] + len(codes)
+        return cls(
+            store, keys, counts, prices, section_offsets,
+            np.concatenate(section_codes).astype(np.int32) if keys else np.empty(0, np.int32),
+            np.concatenate(section_counts).astype(np.int64) if keys else np.empty(0, np.int64)
+        )
+
+    def to_arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        return {
+            f"{prefix}.counts": self.counts,
+            f"{prefix}.prices": self.prices,
+            f"{prefix}.section_offsets": self.section_offsets,
+            f"{prefix}.section_codes": self.section_codes,
+            f"{prefix}.section_counts": self.section_counts
+        }
+
+    @classmethod
+    def from_arrays(cls, store: EntityStore, arrays: Dict[str, np.ndarray], prefix: str, keys: List[str]) -> "AggregateTable":
+        return cls(
+            store, keys, arrays[f"{prefix}.counts"], arrays[f"{prefix}.prices"],
+            arrays[f"{prefix}.section_offsets"], arrays[f"{prefix}.section_codes"], arrays[f"{prefix}.section_counts"]
+        )
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.rows
+
+    def column(self, name: str) -> Dict[str, int]:
+        """{key: count} for one of 'items', 'veg', 'non_veg'."""
+        values = self.counts[:, ('items', 'veg', 'non_veg').index(name)].tolist()
+        return dict(zip(self.keys, values))
+
+    def stats(self, key: str) -> Optional[Dict]:
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        items, veg, non_veg = self.counts[row].tolist()
+        min_price, max_price = self.prices[row].tolist()
+        start, end = int(self.section_offsets[row]), int(self.section_offsets[row + 1])
+        sections = [
+            (self.store.string(int(code)), int(count))
+            for code, count in zip(self.section_codes[start:end], self.section_counts[start:end])
+        ]
+        return {
+            'name': key,
+            'items': items,
+            'veg': veg,
+            'non_veg': non_veg,
+            'min_price': None if np.isnan(min_price) else min_price,
+            'max_price': None if np.isnan(max_price) else max_price,
+            'sections': sections
+        }
@@ -0,0 +1,123 @@
+"""Recall/latency/size benchmark for the FAISS index types and vector storages RestaurantKG can build.
+
+Queries are menu item names sampled from the data dump; ground truth is the
+exact flat float32 index over the same vectors. Size is the serialized index.
+
+Usage:
+    python -m src.knowledge_base.benchmark --queries 200 --k 10
+"""
+import argparse
+import json
+import os
+import time
+from typing import Dict, List
+
+import faiss
+import numpy as np
+
+from src.knowledge_base.index_factory import build_index, normalize_index_spec
+from src.knowledge_base.kg_builder import RestaurantKG
+from src.utils.config import load_config
+
+CANDIDATE_SPECS = [
+    {'type': 'flat'},
+    {'type': 'ivf', 'nlist': 100, 'nprobe': 1},
+    {'type': 'ivf', 'nlist': 100, 'nprobe': 10},
+    {'type': 'ivf', 'nlist': 100, 'nprobe': 32},
+    {'type': 'hnsw', 'hnsw_m': 32, 'ef_search': 16},
+    {'type': 'hnsw', 'hnsw_m': 32, 'ef_search': 64},
+    {'type': 'hnsw', 'hnsw_m': 32, 'ef_search': 128},
+    {'type': 'flat', 'storage': 'float16'},
+    {'type': 'flat', 'storage': 'sq8'},
+    {'type': 'flat', 'storage': 'pq', 'pq_m': 16},
+    {'type': 'flat', 'storage': 'pq', 'pq_m': 48},
+    {'type': 'ivf', 'nlist': 100, 'nprobe': 10, 'storage': 'sq8'},
+    {'type': 'ivf', 'nlist': 100, 'nprobe': 10, 'storage': 'pq', 'pq_m': 48},
+    {'type': 'hnsw', 'hnsw_m': 32, 'ef_search': 64, 'storage': 'sq8'},
+]
+
+
+def describe_spec(spec: Dict, index: faiss.Index) -> str:
+    if spec['type'] == 'ivf':
+        # nlist may have been shrunk to fit the catalog size; report what was built.
+        name = f"ivf nlist={faiss.extract_index_ivf(index).nlist} nprobe={spec['nprobe']}"
+    elif spec['type'] == 'hnsw':
+        name = f"hnsw M={spec['hnsw_m']} efSearch={spec['ef_search']}"
+    else:
+        name = 'flat'
+    if spec['storage'] == 'pq':
+        return f"{name} pq{spec['pq_m']}"
+    return name if spec['storage'] == 'float32' else f"{name} {spec['storage']}"
+
+
+def benchmark_index(vectors: np.ndarray, queries: np.ndarray, ground_truth: np.ndarray, spec: Dict, k: int) -> Dict:
+    """Build one index type and measure recall@k against ground truth plus per-query latency."""
+    start = time.perf_counter()
+    index = build_index(vectors, spec)
+    build_seconds = time.perf_counter() - start
+    latencies = []
+    hits = 0
+    for query, truth in zip(queries, ground_truth):
+        start = time.perf_counter()
+        _, found = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(found[0].tolist()) & set(truth.tolist()))
+    return {
+        'index': describe_spec(spec, index),
+        'build_s': build_seconds,
+        'recall': hits / (len(queries) * k),
+        'size_mb': len(faiss.serialize_index(index)) / 1e6,
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000)
+    }
+
+
+def print_report(rows: List[Dict], k: int) -> None:
+    baseline = rows[0]['size_mb']
+    print(f"\n{'index':<34} {'build s':>8} {f'recall@{k}':>10} {'p50 ms':>8} {'p99 ms':>8} {'size MB':>8} {'ratio':>6}")
+    for row in rows:
+        print(
+            f"{row['index']:<34} {row['build_s']:>8.3f} {row['recall']:>10.3f} "
+            f"{row['p50_ms']:>8.3f} {row['p99_ms']:>8.3f} {row['size_mb']:>8.2f} {baseline / row['size_mb']:>5.1f}x"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default=os.path.join('data', 'eatsure_all_restaurants.json'))
+    parser.add_argument('--cache', default='kg_cache')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    config = load_config()
+    with open(args.data, 'r') as f:
+        data = json.load(f)["data"]
+    kg = RestaurantKG(
+        data,
+        kg_cache_path=args.cache,
+        model_name=config.get('embedding_model', 'all-MiniLM-L6-v2'),
+        encoder=config.get('encoder'),
+        index_spec=config.get('kg_index')
+    )
+    vectors = np.ascontiguousarray(kg.embeddings, dtype=np.float32)
+
+    rng = np.random.default_rng(args.seed)
+    sample = rng.choice(kg.n_rows, size=min(args.queries, kg.n_rows), replace=False)
+    query_texts = [kg.entities[int(kg.row_entities[kg.row_offsets[row]])]['name'] for row in sample]
+    queries = kg.encoder.encode(query_texts)
+
+    exact = build_index(vectors, normalize_index_spec({'type': 'flat'}))
+    _, ground_truth = exact.search(queries, args.k)
+
+    print(f"Benchmarking {len(CANDIDATE_SPECS)} index specs over {len(vectors)} vectors, {len(queries)} queries.")
+    rows = [
+        benchmark_index(vectors, queries, ground_truth, normalize_index_spec(spec), args.k)
+        for spec in CANDIDATE_SPECS
+    ]
+    print_report(rows, args.k)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""In-memory BM25 index over menu items, used next to the FAISS index.
+
+Documents are FAISS rows (one per menu item), so lexical and dense hits
+share ids and can be fused directly.
+"""
+import math
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.knowledge_base.kg_store import encode_postings
+
+STOPWORDS = frozenset("""
+a an the and or of in at on to for from with by near is are was be do does did can could would
+i me my we you your it they them this that these those what which who how where when any some
+show give get tell about please want like have has offer offers serve serves available option options
+menu menus item items dish dishes food foods
+""".split())
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords dropped and plural 's' stripped ("rolls" -> "roll")."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over tokenized documents, stored as CSR posting arrays."""
+
+    def __init__(
+        self,
+        vocabulary: List[str],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        term_freqs: np.ndarray,
+        doc_lengths: np.ndarray,
+        k1: float = 1.2,
+        b: float = 0.5
+    ):
+        self.vocabulary = vocabulary
+        self.term_ids = {term: i for i, term in enumerate(vocabulary)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+
+    @classmethod
+    def build(cls, documents: Sequence[List[str]]) -> "BM25Index":
+        postings: Dict[str, Dict[int, int]] = {}
+        for doc_id, tokens in enumerate(documents):
+            for token in tokens:
+                counts = postings.setdefault(token, {})
+                counts[doc_id] = counts.get(doc_id, 0) + 1
+        vocabulary, offsets, doc_ids = encode_postings({term: list(counts) for term, counts in postings.items()})
+        term_freqs = np.fromiter(
+            (tf for counts in postings.values() for tf in counts.values()), dtype=np.float32, count=len(doc_ids)
+        )
+        doc_lengths = np.array([len(tokens) for tokens in documents], dtype=np.float32)
+        return cls(vocabulary, offsets, doc_ids.astype(np.int32), term_freqs, doc_lengths)
+
+    def to_arrays(self) -> Tuple[Dict[str, np.ndarray], List[str]]:
+        arrays = {
+            'bm25.offsets': self.offsets,
+            'bm25.doc_ids': self.doc_ids,
+            'bm25.term_freqs': self.term_freqs,
+            'bm25.doc_lengths': self.doc_lengths
+        }
+        return arrays, self.vocabulary
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], vocabulary: List[str]) -> "BM25Index":
+        return cls(
+            vocabulary, arrays['bm25.offsets'], arrays['bm25.doc_ids'],
+            arrays['bm25.term_freqs'], arrays['bm25.doc_lengths']
+        )
+
+    def score(self, query: str, allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, int]:
+        """Return (scores, matched-term counts, number of distinct query terms), one entry per document.
+
+        `allowed` is an optional boolean mask; disallowed documents score 0.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        n_docs = len(self.doc_lengths)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        matched = np.zeros(n_docs, dtype=np.int32)
+        for term in terms:
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+            docs = self.doc_ids[start:end]
+            tf = self.term_freqs[start:end]
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[docs] / self.avg_doc_length)
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+            matched[docs] += 1
+        if allowed is not None:
+            scores[~allowed] = 0
+            matched[~allowed] = 0
+        return scores, matched, len(terms)
+
+    def top(self, scores: np.ndarray, n: int) -> np.ndarray:
+        """Ids of the n best-scoring documents with a positive score, best first."""
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > n:
+            candidates = candidates[np.argpartition(-scores[candidates], n - 1)[:n]]
+        return candidates[np.argsort(-scores[candidates], kind='stable')]
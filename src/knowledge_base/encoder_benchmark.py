@@ -0,0 +1,129 @@
+"""Encode latency/throughput benchmark for the embedding backends RestaurantKG can use.
+
+Single-query latency is measured on menu item names (the request-path case);
+throughput on full item embed texts in batches (the build case). Agreement is
+the mean cosine similarity to the full-precision torch vectors.
+
+Usage:
+    python -m src.knowledge_base.encoder_benchmark --backends torch torch-int8 onnx --threads 1 4
+"""
+import argparse
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.knowledge_base.encoders import ENCODER_BACKENDS, SentenceEncoder
+from src.knowledge_base.kg_builder import RestaurantKG
+from src.utils.config import load_config
+
+
+def sample_texts(data: Dict, n: int, seed: int):
+    """(item names, item embed texts) for n menu items sampled from the data dump."""
+    items = []
+    for restaurant_id, details in data.items():
+        for section_type in ('veg', 'non_veg'):
+            for section in details.get(section_type, []):
+                for item in section.get('items', []):
+                    if item.get('name'):
+                        items.append({
+                            'restaurant_name': details.get('restaurant_name', restaurant_id.split('_')[0]),
+                            'section': section.get('section', ''),
+                            'name': item['name'],
+                            'description': item.get('description', ''),
+                            'dietary': 'non-veg' if item.get('is_nonveg', False) else 'veg'
+                        })
+    rng = np.random.default_rng(seed)
+    sample = [items[i] for i in rng.choice(len(items), size=min(n, len(items)), replace=False)]
+    return [item['name'] for item in sample], [RestaurantKG._embed_text(item) for item in sample]
+
+
+def benchmark_encoder(
+    model_name: str,
+    spec: Dict,
+    queries: List[str],
+    texts: List[str],
+    batch_size: int,
+    reference: Optional[np.ndarray]
+) -> Dict:
+    start = time.perf_counter()
+    encoder = SentenceEncoder(model_name, spec)
+    load_seconds = time.perf_counter() - start
+    encoder.encode(queries[:1])
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        encoder.encode([query])
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    vectors = encoder.encode(texts, batch_size=batch_size)
+    batch_seconds = time.perf_counter() - start
+    agreement = None
+    if reference is not None:
+        a = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        b = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+        agreement = float(np.mean(np.sum(a * b, axis=1)))
+    return {
+        'backend': f"{spec['backend']} ({encoder.model.device}) threads={spec['threads'] or 'default'}",
+        'load_s': load_seconds,
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'texts_per_s': len(texts) / max(batch_seconds, 1e-9),
+        'agreement': agreement,
+        'vectors': vectors
+    }
+
+
+def print_report(rows: List[Dict]) -> None:
+    print(f"\n{'backend':<28} {'load s':>7} {'p50 ms':>8} {'p99 ms':>8} {'texts/s':>9} {'cos vs torch':>13}")
+    for row in rows:
+        agreement = f"{row['agreement']:.4f}" if row['agreement'] is not None else 'n/a'
+        print(
+            f"{row['backend']:<28} {row['load_s']:>7.2f} {row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+            f"{row['texts_per_s']:>9.1f} {agreement:>13}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default=os.path.join('data', 'eatsure_all_restaurants.json'))
+    parser.add_argument('--model', default=None, help="defaults to embedding_model from config.yaml")
+    parser.add_argument('--backends', nargs='+', default=list(ENCODER_BACKENDS), choices=ENCODER_BACKENDS)
+    parser.add_argument('--threads', nargs='+', type=int, default=[0], help="0 keeps the library default")
+    parser.add_argument('--onnx-file', default=None)
+    parser.add_argument('--device', default=None, help="torch backend only; defaults to sentence-transformers' choice")
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--texts', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    config = load_config()
+    model_name = args.model or config.get('embedding_model', 'all-MiniLM-L6-v2')
+    with open(args.data, 'r') as f:
+        data = json.load(f)["data"]
+    queries, _ = sample_texts(data, args.queries, args.seed)
+    _, texts = sample_texts(data, args.texts, args.seed + 1)
+
+    print(f"Benchmarking '{model_name}' on {len(queries)} single queries and {len(texts)} batched texts.")
+    rows = []
+    reference = None
+    for backend in args.backends:
+        for threads in args.threads:
+            spec = {'backend': backend, 'threads': threads or None, 'onnx_file': args.onnx_file, 'device': args.device}
+            try:
+                row = benchmark_encoder(model_name, spec, queries, texts, args.batch_size, reference)
+            except ImportError as e:
+                print(f"Skipping backend '{backend}': {e}")
+                continue
+            if backend == 'torch' and reference is None:
+                reference = row['vectors']
+                row['agreement'] = 1.0
+            rows.append(row)
+    print_report(rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Sentence encoders behind one interface, selected by the `encoder` block in config.yaml.
+
+Backends:
+    torch       sentence-transformers in full precision (the reference), on `device`
+                (default: whatever sentence-transformers picks, so a GPU when there is one).
+    torch-int8  the same model on CPU with its Linear layers dynamically quantized to int8.
+    onnx        sentence-transformers' ONNX Runtime backend on CPU (needs optimum[onnxruntime]);
+                `onnx_file` picks a pre-exported variant such as onnx/model_qint8_avx2.onnx.
+
+`threads` caps the intra-op threads of torch / ONNX Runtime so that many worker
+processes on one host do not oversubscribe its cores.
+"""
+import os
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import numpy as np
+
+from src.utils.perf import format_rss
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+DEFAULT_ENCODER_SPEC = {
+    'backend': 'torch',
+    'threads': None,
+    'onnx_file': None,
+    'device': None
+}
+ENCODER_BACKENDS = ('torch', 'torch-int8', 'onnx')
+
+
+def normalize_encoder_spec(spec: Optional[Dict] = None) -> Dict:
+    """Fill in defaults and validate an encoder spec from config."""
+    normalized = dict(DEFAULT_ENCODER_SPEC)
+    normalized.update({k: v for k, v in (spec or {}).items() if v is not None})
+    normalized['backend'] = str(normalized['backend']).lower()
+    if normalized['backend'] not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend '{normalized['backend']}', expected one of {list(ENCODER_BACKENDS)}.")
+    return normalized
+
+
+class SentenceEncoder:
+    """Encodes texts to float32 vectors with a sentence-transformers model on the configured backend."""
+
+    def __init__(self, model_name: str, spec: Optional[Dict] = None):
+        self.model_name = model_name
+        self.spec = normalize_encoder_spec(spec)
+        self.backend = self.spec['backend']
+        start = time.perf_counter()
+        self.model = self._load()
+        self.dimension = int(self.model.get_sentence_embedding_dimension())
+        print(
+            f"Loaded embedding model '{model_name}' ({self.backend} on {self.model.device}, dim {self.dimension}) "
+            f"in {time.perf_counter() - start:.2f}s ({format_rss()})."
+        )
+
+    def _load(self) -> "SentenceTransformer":
+        from sentence_transformers import SentenceTransformer
+        threads = self.spec['threads']
+        if self.backend == 'onnx':
+            import onnxruntime
+            options = onnxruntime.SessionOptions()
+            if threads:
+                options.intra_op_num_threads = int(threads)
+            model_kwargs = {'provider': 'CPUExecutionProvider', 'session_options': options}
+            if self.spec['onnx_file']:
+                model_kwargs['file_name'] = self.spec['onnx_file']
+            return SentenceTransformer(self.model_name, device='cpu', backend='onnx', model_kwargs=model_kwargs)
+        import torch
+        if threads:
+            torch.set_num_threads(int(threads))
+        if self.backend == 'torch':
+            return SentenceTransformer(self.model_name, device=self.spec['device'])
+        # Dynamic quantization only has CPU kernels.
+        model = SentenceTransformer(self.model_name, device='cpu')
+        if self.backend == 'torch-int8':
+            # Weights stored as int8, activations quantized on the fly; no calibration data needed.
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        return model
+
+    def encode(
+        self,
+        texts: List[str],
+        batch_size: int = 32,
+        multi_process: bool = False,
+        num_processes: Optional[int] = None
+    ) -> np.ndarray:
+        """(n, dimension) float32 vectors. `multi_process` spreads batches over one worker per core
+        (torch backend on CPU only; quantized and ONNX models are not shipped to worker processes)."""
+        if multi_process and self.backend == 'torch' and self.model.device.type == 'cpu' and len(texts) > batch_size:
+            pool = self.model.start_multi_process_pool(target_devices=["cpu"] * (num_processes or os.cpu_count() or 1))
+            try:
+                vectors = self.model.encode_multi_process(texts, pool, batch_size=batch_size)
+            finally:
+                self.model.stop_multi_process_pool(pool)
+        else:
+            vectors = self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
@@ -0,0 +1,135 @@
+"""Columnar, array-backed storage for KG entities.
+
+Restaurants and menu items live in typed numpy columns: type, dietary and
+price as small numeric arrays, every string field as int32 codes into one
+shared string table. Repeated values such as restaurant names, locations and
+sections are therefore stored once. Indexing the store yields an
+`EntityView`, a read-only mapping with the same keys the old entity dicts
+had, so callers keep using entity['name'] / entity.get('price').
+"""
+from collections.abc import Mapping, Sequence
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from src.knowledge_base.kg_store import encode_strings
+
+ENTITY_TYPES = ('Restaurant', 'MenuItem')
+DIETARY_VALUES = ('', 'veg', 'non-veg')
+RESTAURANT_FIELDS = ('id', 'type', 'name', 'normalized_name', 'location', 'url')
+MENU_ITEM_FIELDS = (
+    'id', 'type', 'restaurant_id', 'restaurant_name', 'normalized_restaurant_name',
+    'section', 'name', 'price', 'description', 'dietary', 'location'
+)
+NUMERIC_FIELDS = ('type', 'price', 'dietary')
+STRING_FIELDS = tuple(
+    dict.fromkeys(f for f in RESTAURANT_FIELDS + MENU_ITEM_FIELDS if f not in NUMERIC_FIELDS)
+)
+
+
+class EntityView(Mapping):
+    """Read-only dict-like view of one entity row."""
+    __slots__ = ('_store', '_position')
+
+    def __init__(self, store: "EntityStore", position: int):
+        self._store = store
+        self._position = position
+
+    def _fields(self):
+        return RESTAURANT_FIELDS if self._store.types[self._position] == 0 else MENU_ITEM_FIELDS
+
+    def __getitem__(self, key: str):
+        if key not in self._fields():
+            raise KeyError(key)
+        return self._store.value(self._position, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._fields())
+
+    def __len__(self) -> int:
+        return len(self._fields())
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class EntityStore(Sequence):
+    """Sequence of entities backed by numpy columns (possibly memory-mapped)."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.types = arrays['type']
+        self.prices = arrays['price']
+        self.dietary = arrays['dietary']
+        self.string_codes = {field: arrays[f"str.{field}"] for field in STRING_FIELDS}
+        self._string_offsets = arrays['string_offsets']
+        self._string_table = arrays['string_table']
+        self._strings: List[Optional[str]] = [None] * (len(self._string_offsets) - 1)
+
+    @classmethod
+    def from_dicts(cls, entities: List[Dict]) -> "EntityStore":
+        values = [entity.get(field, '') for field in STRING_FIELDS for entity in entities]
+        codes, string_offsets, string_table = encode_strings(values)
+        codes = codes.reshape(len(STRING_FIELDS), len(entities))
+        arrays = {f"str.{field}": codes[i] for i, field in enumerate(STRING_FIELDS)}
+        arrays['type'] = np.array([ENTITY_TYPES.index(e['type']) for e in entities], dtype=np.uint8)
+        arrays['price'] = np.array([e.get('price', 0.0) for e in entities], dtype=np.float32)
+        arrays['dietary'] = np.array([DIETARY_VALUES.index(e.get('dietary', '')) for e in entities], dtype=np.uint8)
+        arrays['string_offsets'] = string_offsets
+        arrays['string_table'] = string_table
+        return cls(arrays)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {f"str.{field}": codes for field, codes in self.string_codes.items()}
+        arrays['type'] = self.types
+        arrays['price'] = self.prices
+        arrays['dietary'] = self.dietary
+        arrays['string_offsets'] = self._string_offsets
+        arrays['string_table'] = self._string_table
+        return arrays
+
+    def string(self, code: int) -> str:
+        """Decode one string-table entry, caching it so each distinct string is decoded once."""
+        value = self._strings[code]
+        if value is None:
+            start, end = int(self._string_offsets[code]), int(self._string_offsets[code + 1])
+            value = self._string_table[start:end].tobytes().decode("utf-8")
+            self._strings[code] = value
+        return value
+
+    def value(self, position: int, field: str):
+        if field == 'type':
+            return ENTITY_TYPES[self.types[position]]
+        if field == 'price':
+            return float(self.prices[position])
+        if field == 'dietary':
+            return DIETARY_VALUES[self.dietary[position]]
+        return self.string(int(self.string_codes[field][position]))
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [EntityView(self, i) for i in range(*position.indices(len(self)))]
+        position = int(position)
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return EntityView(self, position)
+
+    def __iter__(self) -> Iterator[EntityView]:
+        for position in range(len(self)):
+            yield EntityView(self, position)
+
+    def filter_location(self, positions: np.ndarray, location: str) -> np.ndarray:
+        """Keep positions whose location contains `location` (case-insensitive), comparing each distinct location once."""
+        return self.filter_contains(positions, 'location', location)
+
+    def filter_contains(self, positions: np.ndarray, field: str, value: str) -> np.ndarray:
+        """Keep positions whose string `field` contains `value` (case-insensitive), comparing each distinct string once."""
+        positions = np.asarray(positions, dtype=np.int64)
+        codes = self.string_codes[field][positions]
+        needle = value.lower()
+        matching = [code for code in np.unique(codes).tolist() if needle in self.string(code).lower()]
+        return positions[np.isin(codes, matching)]
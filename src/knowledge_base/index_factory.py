@@ -0,0 +1,128 @@
+from typing import TYPE_CHECKING, Dict, Optional
+import numpy as np
+
+if TYPE_CHECKING:
+    import faiss
+
+# flat: exact search; ivf: inverted lists probed `nprobe` of `nlist`; hnsw: graph with `hnsw_m` links per node.
+# storage: how vectors are kept in the index. float32 is exact, float16 halves it, sq8 (one byte per
+# dimension) quarters it and pq stores `pq_m` codes of `pq_bits` bits per vector.
+DEFAULT_INDEX_SPEC = {
+    'type': 'flat',
+    'storage': 'float32',
+    'pq_m': 16,
+    'pq_bits': 8,
+    'nlist': 100,
+    'nprobe': 10,
+    'hnsw_m': 32,
+    'ef_construction': 40,
+    'ef_search': 64
+}
+
+# Keys that change the stored index; the rest are search-time knobs applied on load.
+BUILD_KEYS = {
+    'flat': ('type',),
+    'ivf': ('type', 'nlist'),
+    'hnsw': ('type', 'hnsw_m', 'ef_construction')
+}
+STORAGE_BUILD_KEYS = {
+    'float32': ('storage',),
+    'float16': ('storage',),
+    'sq8': ('storage',),
+    'pq': ('storage', 'pq_m', 'pq_bits')
+}
+
+
+def normalize_index_spec(spec: Optional[Dict] = None) -> Dict:
+    """Fill in defaults and validate an index spec from config."""
+    normalized = dict(DEFAULT_INDEX_SPEC)
+    normalized.update({k: v for k, v in (spec or {}).items() if v is not None})
+    normalized['type'] = str(normalized['type']).lower()
+    if normalized['type'] not in BUILD_KEYS:
+        raise ValueError(f"Unknown index type '{normalized['type']}', expected one of {sorted(BUILD_KEYS)}.")
+    normalized['storage'] = str(normalized['storage']).lower()
+    if normalized['storage'] not in STORAGE_BUILD_KEYS:
+        raise ValueError(
+            f"Unknown index storage '{normalized['storage']}', expected one of {sorted(STORAGE_BUILD_KEYS)}."
+        )
+    return normalized
+
+
+def index_build_key(spec: Dict) -> Dict:
+    """The part of a spec recorded in the cache manifest to detect a mismatched index."""
+    return {key: spec[key] for key in BUILD_KEYS[spec['type']] + STORAGE_BUILD_KEYS[spec['storage']]}
+
+
+def embedding_dtype(spec: Dict) -> np.dtype:
+    """dtype of the raw vectors cached next to the index; quantized indexes keep them as float16."""
+    return np.dtype(np.float32 if spec['storage'] == 'float32' else np.float16)
+
+
+def _pq_params(dimension: int, n_vectors: int, spec: Dict):
+    """(m, bits) for product quantization: m must divide the dimension and each
+    codebook needs at least 2**bits training points, so both shrink to fit."""
+    m = max(1, min(int(spec['pq_m']), dimension))
+    while dimension % m:
+        m -= 1
+    bits = max(1, min(int(spec['pq_bits']), int(np.log2(max(n_vectors, 2)))))
+    return m, bits
+
+
+def read_flags(index_type: str) -> int:
+    """faiss.read_index flags that map a stored index read-only instead of copying it into RAM.
+
+    IO_FLAG_MMAP only maps IVF inverted lists; flat codes and HNSW storage need
+    IO_FLAG_MMAP_IFC, which in turn cannot open IVF indexes, so the two are never combined.
+    """
+    import faiss
+    if index_type == 'ivf':
+        return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    return faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+
+
+def apply_search_params(index: "faiss.Index", spec: Dict) -> None:
+    import faiss
+    if spec['type'] == 'ivf':
+        faiss.extract_index_ivf(index).nprobe = int(spec['nprobe'])
+    elif spec['type'] == 'hnsw':
+        index.hnsw.efSearch = int(spec['ef_search'])
+
+
+def build_index(vectors: np.ndarray, spec: Dict) -> "faiss.Index":
+    """Build and fill a FAISS index of the requested type over `vectors`."""
+    import faiss
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    dimension = vectors.shape[1]
+    storage = spec['storage']
+    scalar_types = {'float16': faiss.ScalarQuantizer.QT_fp16, 'sq8': faiss.ScalarQuantizer.QT_8bit}
+    if storage == 'pq':
+        pq_m, pq_bits = _pq_params(dimension, len(vectors), spec)
+    if spec['type'] == 'ivf':
+        # FAISS wants roughly 39 training points per list; shrink nlist for small catalogs.
+        nlist = max(1, min(int(spec['nlist']), len(vectors) // 39))
+        quantizer = faiss.IndexFlatL2(dimension)
+        if storage in scalar_types:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, scalar_types[storage], faiss.METRIC_L2)
+        elif storage == 'pq':
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, pq_bits)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+    elif spec['type'] == 'hnsw':
+        if storage in scalar_types:
+            index = faiss.IndexHNSWSQ(dimension, scalar_types[storage], int(spec['hnsw_m']))
+        elif storage == 'pq':
+            index = faiss.IndexHNSWPQ(dimension, pq_m, int(spec['hnsw_m']), pq_bits)
+        else:
+            index = faiss.IndexHNSWFlat(dimension, int(spec['hnsw_m']))
+        index.hnsw.efConstruction = int(spec['ef_construction'])
+    elif storage in scalar_types:
+        index = faiss.IndexScalarQuantizer(dimension, scalar_types[storage], faiss.METRIC_L2)
+    elif storage == 'pq':
+        index = faiss.IndexPQ(dimension, pq_m, pq_bits)
+    else:
+        index = faiss.IndexFlatL2(dimension)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    apply_search_params(index, spec)
+    return index
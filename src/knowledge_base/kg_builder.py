@@ -1,56 +1,565 @@
-from typing import Dict, List, Tuple, Optional
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Iterator, List, Tuple, Optional
 import numpy as np
-from sentence_transformers import SentenceTransformer
-import faiss
+import hashlib
+import json
 import os
 import pickle
+import threading
+import time
+from src.knowledge_base.aggregates import AggregateTable
+from src.knowledge_base.bm25 import BM25Index, tokenize
+from src.knowledge_base.encoders import SentenceEncoder, normalize_encoder_spec
+from src.knowledge_base.entity_store import DIETARY_VALUES, ENTITY_TYPES, EntityStore
+from src.knowledge_base.index_factory import (
+    apply_search_params, build_index, embedding_dtype, index_build_key, normalize_index_spec,
+    read_flags
+)
+from src.knowledge_base.tags import extract_tags, parse_nutrition
+from src.knowledge_base.query_cache import QueryEmbeddingCache, normalize_query
+from src.knowledge_base.name_resolver import RestaurantNameResolver
+from src.knowledge_base.kg_store import atomic_write, decode_postings, encode_postings, read_store, write_store
+from src.utils.perf import format_rss
 from src.utils.text_utils import normalize_name, clean_text, parse_price
 
+# The encoder (torch / ONNX Runtime) and faiss are imported on first use so that
+# lookup-only processes never pay for them.
+if TYPE_CHECKING:
+    import faiss
+
+MANIFEST_VERSION = 3
+# Oldest manifest whose item hashes match the current embed text (location left out).
+EMBED_TEXT_VERSION = 2
+# Bumped whenever the column layout of kg_cache_entities.bin changes.
+ENTITY_STORE_VERSION = 8
+# Reciprocal-rank-fusion constant for merging lexical and dense rankings.
+RRF_K = 60
+# Location filters whose FAISS id selectors are kept (least recently used ones are dropped).
+LOCATION_SELECTOR_CACHE_SIZE = 64
+
+RESTAURANT_TYPE = ENTITY_TYPES.index('Restaurant')
+MENU_ITEM_TYPE = ENTITY_TYPES.index('MenuItem')
+NO_POSITIONS = np.empty(0, dtype=np.int64)
+
+
+def _content_hash(content) -> str:
+    """Stable SHA-1 of a text or JSON-serialisable object."""
+    if not isinstance(content, str):
+        content = json.dumps(content, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
 class RestaurantKG:
     def __init__(
         self,
         data: Optional[Dict] = None,
         kg_cache_path: str = "kg_cache",
-        model_name: str = 'all-MiniLM-L6-v2'
+        model_name: str = 'all-MiniLM-L6-v2',
+        encode_batch_size: int = 256,
+        multi_process: bool = False,
+        num_processes: Optional[int] = None,
+        index_spec: Optional[Dict] = None,
+        query_cache_size: int = 1024,
+        hybrid_search: bool = True,
+        encoder: Optional[Dict] = None
     ):
+        start = time.perf_counter()
         self.model_name = model_name
-        self.model = SentenceTransformer(self.model_name)
+        self.encoder_spec = normalize_encoder_spec(encoder)
+        self._encoder: Optional[SentenceEncoder] = None
+        # Guards lazy loading of the encoder and index when lookups run on several threads.
+        self._load_lock = threading.RLock()
+        self.encode_batch_size = encode_batch_size
+        self.multi_process = multi_process
+        self.num_processes = num_processes
+        self.index_spec = normalize_index_spec(index_spec)
+        self.query_cache = QueryEmbeddingCache(query_cache_size)
+        self.hybrid_search = hybrid_search
         self.kg_cache_path = kg_cache_path
-        self.entities = []
-        self.menuitem_indices = []
-        self.index = None
+        self.entities = EntityStore.from_dicts([])
+        self.menuitem_indices = NO_POSITIONS
+        # FAISS rows are chain items: row r is shared by the outlets row_entities[row_offsets[r]:row_offsets[r + 1]].
+        self.row_offsets = np.zeros(1, dtype=np.int64)
+        self.row_entities = NO_POSITIONS
+        self.entity_rows = NO_POSITIONS
+        self._outdated_entities = False
+        self._index: Optional["faiss.Index"] = None
+        self._index_path: Optional[str] = None
+        self.embeddings = None
+        self.item_hashes = []
+        self.restaurant_hashes = {}
+        self.manifest = {}
+        # Hash of the manifest the KG was last saved or loaded with; changes whenever data, model or index change.
+        self.build_version = ''
+        # Secondary indexes over self.entities, built with the KG and persisted alongside it.
+        self.restaurant_index: Dict[str, np.ndarray] = {}
+        self.restaurant_entity_index: Dict[str, np.ndarray] = {}
+        self.location_index: Dict[str, np.ndarray] = {}
+        self.location_restaurants: Dict[str, List[str]] = {}
+        self.dietary_index: Dict[str, Dict[str, np.ndarray]] = {}
+        # BM25 over menu items; document ids are FAISS rows.
+        self.bm25: Optional[BM25Index] = None
+        # Per-restaurant and per-location counts, price bands and section histograms.
+        self.restaurant_stats: Optional[AggregateTable] = None
+        self.location_stats: Optional[AggregateTable] = None
+        # Tag -> sorted menu item positions, and per-entity kcal / protein (NaN when not stated).
+        self.tag_index: Dict[str, np.ndarray] = {}
+        self.kcal = np.empty(0, dtype=np.float32)
+        self.protein = np.empty(0, dtype=np.float32)
+        # Menu item positions sorted by price: overall ('all' -> ''), per restaurant and per section.
+        self.price_index: Dict[str, Dict[str, np.ndarray]] = {}
+        self._sorted_prices: Dict[Tuple[str, str], np.ndarray] = {}
+        # Trigram index over restaurant names, built on first use.
+        self._name_resolver: Optional[RestaurantNameResolver] = None
+        # FAISS id selectors (and allowed row counts) per filtered location set, built on first use.
+        self._location_selectors: "OrderedDict[Tuple[str, ...], Tuple[faiss.IDSelector, int]]" = OrderedDict()
 
-        if self._kg_cache_exists():
-            self._load_kg_cache()
+        # The legacy pickle cache is only read when there is no data to build from: its vectors
+        # predate the current embed text and would be re-encoded anyway.
+        if self._kg_cache_exists() or (data is None and self._legacy_kg_cache_exists()):
+            migrate = not self._kg_cache_exists()
+            if migrate:
+                self._load_legacy_kg_cache()
+            else:
+                self._load_kg_cache()
             print("Knowledge Graph and FAISS index loaded from cache.")
+            if data is None and self._outdated_entities:
+                raise ValueError("KG cache uses an outdated entity format and no data was provided to rebuild it.")
+            if data is not None and self._cache_is_stale(data):
+                self.data = data
+                self._update_knowledge_graph()
+                self._save_kg_cache()
+                print("Knowledge Graph and FAISS index updated and cached.")
+            elif self.manifest.get('index', {'type': 'flat'}) != index_build_key(self.index_spec):
+                self._rebuild_index()
+                self._save_kg_cache()
+            elif migrate:
+                self._save_kg_cache()
+                print("Migrated pickle KG cache to the memory-mapped format.")
         elif data is not None:
+            if self._legacy_kg_cache_exists():
+                print("Ignoring the legacy pickle KG cache; building from data.")
             self.data = data
             self._build_knowledge_graph()
             self._save_kg_cache()
             print("Knowledge Graph and FAISS index built and cached.")
         else:
             raise ValueError("No data provided and no cache found.")
+        print(f"RestaurantKG ready in {time.perf_counter() - start:.2f}s ({format_rss()}).")
+
+    @property
+    def encoder(self) -> SentenceEncoder:
+        """The embedding model on the configured backend, loaded on first use."""
+        with self._load_lock:
+            if self._encoder is None:
+                encoder = SentenceEncoder(self.model_name, self.encoder_spec)
+                cached_dimension = self.manifest.get('embedding_dimension')
+                if self.manifest.get('model_name') == self.model_name and cached_dimension not in (None, encoder.dimension):
+                    raise ValueError(
+                        f"Embedding model '{self.model_name}' has dimension {encoder.dimension} but the KG cache "
+                        f"was built with {cached_dimension}; delete the cache or rebuild it from data."
+                    )
+                self._encoder = encoder
+        return self._encoder
+
+    @property
+    def index(self) -> Optional["faiss.Index"]:
+        """The FAISS index; a cached index is only opened (memory-mapped) on first use."""
+        if self._index is None and self._index_path is not None:
+            with self._load_lock:
+                if self._index is None and self._index_path is not None:
+                    import faiss
+                    # The stored index may predate a config change; its own type decides how it can be mapped.
+                    index_type = self.manifest.get('index', {'type': 'flat'})['type']
+                    try:
+                        # Mapped read-only: pages are shared between processes and loaded on demand.
+                        index = faiss.read_index(self._index_path, read_flags(index_type))
+                    except RuntimeError:
+                        index = faiss.read_index(self._index_path)
+                    cached_dimension = self.manifest.get('embedding_dimension')
+                    if cached_dimension not in (None, index.d):
+                        raise ValueError(
+                            f"Cached FAISS index has dimension {index.d} but the KG cache manifest records "
+                            f"{cached_dimension}; delete the cache or rebuild it from data."
+                        )
+                    apply_search_params(index, self.index_spec)
+                    self._index = index
+                    self._index_path = None
+        return self._index
+
+    @index.setter
+    def index(self, value: Optional["faiss.Index"]):
+        self._index = value
+        self._index_path = None
+
+    @property
+    def name_resolver(self) -> RestaurantNameResolver:
+        """Fuzzy matcher over the normalized names of all restaurants in the KG."""
+        if self._name_resolver is None:
+            self._name_resolver = RestaurantNameResolver(
+                sorted(set(self.restaurant_entity_index) | set(self.restaurant_index))
+            )
+        return self._name_resolver
+
+    def resolve_restaurant(self, name: str, limit: int = 5) -> List[str]:
+        """Normalized restaurant names matching a possibly misspelled, partial or slug-form name, best first."""
+        return [candidate for candidate, _ in self.name_resolver.resolve(name, limit=limit)]
+
+    def warmup(self, popular_queries: Optional[List[str]] = None):
+        """Load the model and index and run one query now instead of on the first request.
+
+        `popular_queries` are encoded in one batch into the query-embedding cache.
+        """
+        start = time.perf_counter()
+        self.search("warmup", k=1)
+        if popular_queries:
+            self.prewarm_query_cache(popular_queries)
+        print(f"RestaurantKG warmed up in {time.perf_counter() - start:.2f}s ({format_rss()}).")
 
     def _kg_cache_exists(self):
+        return (
+            os.path.exists(f"{self.kg_cache_path}_entities.bin") and
+            os.path.exists(f"{self.kg_cache_path}_faiss.index") and
+            os.path.exists(f"{self.kg_cache_path}_manifest.json")
+        )
+
+    def _legacy_kg_cache_exists(self):
         return (
             os.path.exists(f"{self.kg_cache_path}_entities.pkl") and
             os.path.exists(f"{self.kg_cache_path}_menuitem_indices.pkl") and
             os.path.exists(f"{self.kg_cache_path}_faiss.index")
         )
 
+    def _entity_arrays(self) -> Tuple[Dict[str, np.ndarray], Dict]:
+        """Columnar entity table plus lookup indexes as CSR posting arrays."""
+        arrays = self.entities.to_arrays()
+        arrays['menuitem_indices'] = np.asarray(self.menuitem_indices, dtype=np.int64)
+        arrays['rows.offsets'] = self.row_offsets
+        arrays['rows.entities'] = self.row_entities
+        lookup = self._lookup_indexes()
+        groups = {
+            'restaurant': lookup['restaurant'],
+            'restaurant_entity': lookup['restaurant_entity'],
+            'location': lookup['location'],
+            'tags': self.tag_index,
+            **{f"price:{group}": postings for group, postings in self.price_index.items()},
+            **{f"dietary:{dietary}": postings for dietary, postings in lookup['dietary'].items()}
+        }
+        posting_keys = {}
+        for group, postings in groups.items():
+            posting_keys[group], arrays[f"{group}.offsets"], arrays[f"{group}.values"] = encode_postings(postings)
+        bm25_arrays, bm25_vocabulary = self.bm25.to_arrays()
+        arrays.update(bm25_arrays)
+        arrays.update(self.restaurant_stats.to_arrays('stats:restaurant'))
+        arrays.update(self.location_stats.to_arrays('stats:location'))
+        arrays['nutrition.kcal'] = self.kcal
+        arrays['nutrition.protein'] = self.protein
+        meta = {
+            'format': ENTITY_STORE_VERSION,
+            'postings': posting_keys,
+            'location_restaurants': lookup['location_restaurants'],
+            'bm25_vocabulary': bm25_vocabulary,
+            'stats': {'restaurant': self.restaurant_stats.keys, 'location': self.location_stats.keys}
+        }
+        return arrays, meta
+
+    def _set_entity_arrays(self, arrays: Dict[str, np.ndarray], meta: Dict):
+        """Adopt mapped arrays as-is: entities and posting lists stay views into the store file."""
+        self.entities = EntityStore(arrays)
+        self.menuitem_indices = arrays['menuitem_indices']
+        self._set_rows(arrays['rows.offsets'], arrays['rows.entities'])
+        postings = {
+            group: decode_postings(keys, arrays[f"{group}.offsets"], arrays[f"{group}.values"])
+            for group, keys in meta['postings'].items()
+        }
+        self._set_lookup_indexes({
+            'restaurant': postings['restaurant'],
+            'restaurant_entity': postings['restaurant_entity'],
+            'location': postings['location'],
+            'location_restaurants': meta['location_restaurants'],
+            'dietary': {
+                group.split(':', 1)[1]: locations for group, locations in postings.items() if group.startswith('dietary:')
+            }
+        })
+        self.tag_index = postings['tags']
+        self.price_index = {
+            group.split(':', 1)[1]: sorted_positions for group, sorted_positions in postings.items() if group.startswith('price:')
+        }
+        self._sorted_prices = {}
+        self.kcal = arrays['nutrition.kcal']
+        self.protein = arrays['nutrition.protein']
+        self.bm25 = BM25Index.from_arrays(arrays, meta['bm25_vocabulary'])
+        self.restaurant_stats = AggregateTable.from_arrays(
+            self.entities, arrays, 'stats:restaurant', meta['stats']['restaurant']
+        )
+        self.location_stats = AggregateTable.from_arrays(self.entities, arrays, 'stats:location', meta['stats']['location'])
+
     def _save_kg_cache(self):
-        with open(f"{self.kg_cache_path}_entities.pkl", "wb") as f:
-            pickle.dump(self.entities, f)
-        with open(f"{self.kg_cache_path}_menuitem_indices.pkl", "wb") as f:
-            pickle.dump(self.menuitem_indices, f)
-        faiss.write_index(self.index, f"{self.kg_cache_path}_faiss.index")
+        arrays, meta = self._entity_arrays()
+        write_store(f"{self.kg_cache_path}_entities.bin", arrays, meta)
+        import faiss
+        atomic_write(f"{self.kg_cache_path}_faiss.index", lambda path: faiss.write_index(self.index, path))
+        if self.embeddings is not None:
+            embeddings = np.ascontiguousarray(self.embeddings, dtype=embedding_dtype(self.index_spec))
+
+            def write_embeddings(path: str):
+                with open(path, "wb") as f:
+                    np.save(f, embeddings)
+
+            atomic_write(f"{self.kg_cache_path}_embeddings.npy", write_embeddings)
+        self.manifest = {
+            'version': MANIFEST_VERSION,
+            'model_name': self.model_name,
+            'embedding_dimension': int(self.index.d) if self.index is not None else None,
+            'encoder': self.encoder_spec['backend'],
+            'index': index_build_key(self.index_spec),
+            'restaurants': self.restaurant_hashes,
+            'items': self.item_hashes
+        }
+        self.build_version = _content_hash(self.manifest)
+
+        def write_manifest(path: str):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.manifest, f)
+
+        atomic_write(f"{self.kg_cache_path}_manifest.json", write_manifest)
 
     def _load_kg_cache(self):
+        arrays, meta = read_store(f"{self.kg_cache_path}_entities.bin")
+        self._load_index_and_manifest()
+        if meta.get('format') != ENTITY_STORE_VERSION:
+            # Cached vectors stay usable; entities are rebuilt from data via the stale-cache path.
+            print("KG cache entity format is outdated; entities will be rebuilt from data.")
+            self._outdated_entities = True
+            self.restaurant_hashes = {}
+            return
+        self._set_entity_arrays(arrays, meta)
+
+    def _load_index_and_manifest(self):
+        self._index = None
+        self._index_path = f"{self.kg_cache_path}_faiss.index"
+        manifest_path = f"{self.kg_cache_path}_manifest.json"
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+            self.restaurant_hashes = self.manifest.get('restaurants', {})
+            self.item_hashes = self.manifest.get('items', [])
+            self.build_version = _content_hash(self.manifest)
+        embeddings_path = f"{self.kg_cache_path}_embeddings.npy"
+        if os.path.exists(embeddings_path):
+            self.embeddings = np.load(embeddings_path, mmap_mode="r")
+
+    def _load_legacy_kg_cache(self):
+        """One-time read of the old pickle cache; it is rewritten in the mapped format right after."""
         with open(f"{self.kg_cache_path}_entities.pkl", "rb") as f:
-            self.entities = pickle.load(f)
+            self.entities = EntityStore.from_dicts(pickle.load(f))
         with open(f"{self.kg_cache_path}_menuitem_indices.pkl", "rb") as f:
-            self.menuitem_indices = pickle.load(f)
-        self.index = faiss.read_index(f"{self.kg_cache_path}_faiss.index")
+            self.menuitem_indices = np.asarray(pickle.load(f), dtype=np.int64)
+        # The pickle cache has one FAISS row per outlet item.
+        self._set_rows(np.arange(len(self.menuitem_indices) + 1, dtype=np.int64), self.menuitem_indices)
+        self._build_lookup_indexes()
+        self._build_lexical_index()
+        self._build_aggregates()
+        self._build_tag_index()
+        self._build_price_index()
+        self._load_index_and_manifest()
+
+    def _cache_is_stale(self, data: Dict) -> bool:
+        """True if the cached KG was built from different data or with a different model."""
+        if self.manifest.get('version') != MANIFEST_VERSION or self.manifest.get('model_name') != self.model_name:
+            return True
+        # Only an already loaded encoder is compared; the index is checked when it is first opened.
+        if self._encoder is not None and self.manifest.get('embedding_dimension') != self._encoder.dimension:
+            return True
+        current = {restaurant_id: _content_hash(details) for restaurant_id, details in data.items()}
+        return current != self.restaurant_hashes
+
+    def _cached_embeddings(self) -> Dict[str, np.ndarray]:
+        """Map item content hash -> cached vector, empty if the cached vectors cannot be reused."""
+        if self.manifest.get('model_name', self.model_name) != self.model_name:
+            return {}
+        if self.manifest.get('version', 0) < EMBED_TEXT_VERSION:
+            print("Embed text changed since the cache was built, re-encoding all items.")
+            return {}
+        if self.embeddings is not None and len(self.embeddings) == len(self.item_hashes):
+            return dict(zip(self.item_hashes, self.embeddings))
+        return {}
+
+    def _rebuild_index(self):
+        """Rebuild the FAISS index from the cached vectors for the configured index spec (no re-encoding)."""
+        if self.embeddings is None:
+            self.embeddings = self.index.reconstruct_n(0, self.index.ntotal)
+        start = time.perf_counter()
+        self.index = build_index(self.embeddings, self.index_spec)
+        print(
+            f"Rebuilt FAISS index as '{self.index_spec['type']}' with {self.index_spec['storage']} storage "
+            f"in {time.perf_counter() - start:.2f}s."
+        )
+
+    def _update_knowledge_graph(self):
+        """Rebuild from self.data, re-embedding only new or changed menu items."""
+        cached = self._cached_embeddings()
+        print(f"Cache is stale, updating incrementally ({len(cached)} cached item embeddings).")
+        self._build_knowledge_graph(cached)
+        if cached:
+            removed = len(set(cached) - set(self.item_hashes))
+            print(f"Removed {removed} menu items that are no longer in the data.")
+
+    def _lookup_indexes(self) -> Dict:
+        return {
+            'restaurant': self.restaurant_index,
+            'restaurant_entity': self.restaurant_entity_index,
+            'location': self.location_index,
+            'location_restaurants': self.location_restaurants,
+            'dietary': self.dietary_index
+        }
+
+    def _set_lookup_indexes(self, indexes: Dict):
+        self.restaurant_index = indexes['restaurant']
+        self.restaurant_entity_index = indexes['restaurant_entity']
+        self.location_index = indexes['location']
+        self.location_restaurants = indexes['location_restaurants']
+        self.dietary_index = indexes['dietary']
+        self._location_selectors = OrderedDict()
+        self._name_resolver = None
+
+    def _group_positions(self, positions: np.ndarray, field: str, key=None) -> Dict[str, np.ndarray]:
+        """Group entity positions by the value of a string column; each group keeps entity order."""
+        codes = self.entities.string_codes[field][positions]
+        unique_codes, inverse = np.unique(codes, return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[order], np.arange(len(unique_codes) + 1))
+        groups: Dict[str, np.ndarray] = {}
+        for i, code in enumerate(unique_codes.tolist()):
+            name = self.entities.string(code)
+            name = key(name) if key else name
+            group = positions[order[bounds[i]:bounds[i + 1]]]
+            # Different raw strings can share a key (e.g. case variants); merge them in entity order.
+            groups[name] = np.sort(np.concatenate([groups[name], group])) if name in groups else group
+        return groups
+
+    def _build_lookup_indexes(self):
+        """Build inverted indexes: restaurant name, location and dietary -> entity positions.
+
+        Position arrays are in entity order, so lookups return items in the same
+        order as a scan over self.entities would.
+        """
+        types = self.entities.types
+        restaurants = np.flatnonzero(types == RESTAURANT_TYPE)
+        items = np.flatnonzero(types == MENU_ITEM_TYPE)
+        lower = str.lower
+        location_index = self._group_positions(items, 'location', lower)
+        location_restaurants: Dict[str, set] = {}
+        for positions, field in ((restaurants, 'name'), (items, 'restaurant_name')):
+            for location, group in self._group_positions(positions, 'location', lower).items():
+                names = location_restaurants.setdefault(location, set())
+                for code in np.unique(self.entities.string_codes[field][group]).tolist():
+                    names.add(self.entities.string(code))
+        dietary_index = {}
+        for code, dietary in enumerate(DIETARY_VALUES):
+            group = items[self.entities.dietary[items] == code]
+            if len(group):
+                dietary_index[dietary] = self._group_positions(group, 'location', lower)
+        self._set_lookup_indexes({
+            'restaurant': self._group_positions(items, 'normalized_restaurant_name'),
+            'restaurant_entity': self._group_positions(restaurants, 'normalized_name'),
+            'location': location_index,
+            'location_restaurants': {loc: sorted(names) for loc, names in location_restaurants.items()},
+            'dietary': dietary_index
+        })
+
+    def _set_rows(self, row_offsets: np.ndarray, row_entities: np.ndarray):
+        """Adopt the FAISS row -> outlet CSR and derive the inverse entity -> row map (-1 for restaurants)."""
+        self.row_offsets = row_offsets
+        self.row_entities = row_entities
+        self.entity_rows = np.full(len(self.entities), -1, dtype=np.int64)
+        self.entity_rows[row_entities] = np.repeat(np.arange(len(row_offsets) - 1), np.diff(row_offsets))
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.row_offsets) - 1
+
+    def _row_entity(self, row: int, location_filter: Optional[str] = None) -> Dict:
+        """The outlet of a chain item to report: the first one, or the first in a location matching the filter."""
+        outlets = self.row_entities[self.row_offsets[row]:self.row_offsets[row + 1]]
+        if location_filter:
+            outlets = self.entities.filter_location(outlets, location_filter)
+        return self.entities[int(outlets[0])]
+
+    def _build_lexical_index(self):
+        """BM25 over item name (weighted 3x), restaurant, section and description, one document per FAISS row."""
+        documents = []
+        for position in self.row_entities[self.row_offsets[:-1]].tolist():
+            entity = self.entities[position]
+            documents.append(tokenize(
+                f"{entity['name']} {entity['name']} {entity['name']} {entity['restaurant_name']} "
+                f"{entity['section']} {entity['description']}"
+            ))
+        self.bm25 = BM25Index.build(documents)
+
+    def _build_aggregates(self):
+        """Materialize stats per restaurant (including ones without items) and per location."""
+        names = sorted(set(self.restaurant_entity_index) | set(self.restaurant_index))
+        restaurants = {name: self.restaurant_index.get(name, NO_POSITIONS) for name in names}
+        self.restaurant_stats = AggregateTable.build(self.entities, restaurants)
+        self.location_stats = AggregateTable.build(self.entities, self.location_index)
+
+    def _build_tag_index(self):
+        """Extract tags and kcal / protein from every item's name and cleaned description."""
+        postings: Dict[str, List[int]] = {}
+        self.kcal = np.full(len(self.entities), np.nan, dtype=np.float32)
+        self.protein = np.full(len(self.entities), np.nan, dtype=np.float32)
+        for position in self.menuitem_indices.tolist():
+            entity = self.entities[position]
+            for tag in extract_tags(entity['name'], entity['description']):
+                postings.setdefault(tag, []).append(position)
+            kcal, protein = parse_nutrition(entity['description'])
+            if kcal is not None:
+                self.kcal[position] = kcal
+            if protein is not None:
+                self.protein[position] = protein
+        self.tag_index = {tag: np.asarray(positions, dtype=np.int64) for tag, positions in sorted(postings.items())}
+
+    def _build_price_index(self):
+        """Price-sorted position arrays (ties in entity order) for binary-searched price ranges and cheapest-first scans."""
+        items = self.menuitem_indices
+        by_price = items[np.lexsort((items, self.entities.prices[items]))]
+        ranks = np.empty(len(self.entities), dtype=np.int64)
+        ranks[by_price] = np.arange(len(by_price))
+
+        def price_sorted(groups: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+            return {key: positions[np.argsort(ranks[positions], kind='stable')] for key, positions in groups.items()}
+
+        self.price_index = {
+            'all': {'': by_price},
+            'restaurant': price_sorted(self.restaurant_index),
+            'section': price_sorted(self._group_positions(items, 'section', str.lower))
+        }
+        self._sorted_prices = {}
+
+    def _price_sorted(self, group: str, key: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(positions, their prices) of one price-sorted group; prices are gathered once and kept."""
+        positions = self.price_index[group].get(key, NO_POSITIONS)
+        if (group, key) not in self._sorted_prices:
+            self._sorted_prices[(group, key)] = self.entities.prices[positions]
+        return positions, self._sorted_prices[(group, key)]
+
+    def _matching_locations(self, location: str) -> List[str]:
+        """Indexed location keys containing `location` (same substring semantics as the filters)."""
+        norm_location = location.lower()
+        return [loc for loc in self.location_restaurants if norm_location in loc]
+
+    def _positions_for_locations(self, index: Dict[str, np.ndarray], location: Optional[str]) -> np.ndarray:
+        """Merge the sorted position arrays of every location matching the filter."""
+        keys = self._matching_locations(location) if location else list(index)
+        groups = [index[key] for key in keys if key in index]
+        return np.sort(np.concatenate(groups)) if groups else NO_POSITIONS
+
+    def _restaurant_positions(self, restaurant_name: str, location: Optional[str] = None) -> np.ndarray:
+        positions = self.restaurant_index.get(normalize_name(restaurant_name), NO_POSITIONS)
+        if location and len(positions):
+            positions = self.entities.filter_location(positions, location)
+        return positions
 
     def _parse_key(self, key: str) -> Tuple[str, str]:
         parts = key.split('_')
@@ -60,10 +569,55 @@ class RestaurantKG:
             return name, location
         return key, ""
 
-    def _build_knowledge_graph(self):
-        menuitem_embeddings = []
+    def _encode_texts(self, texts: List[str]) -> np.ndarray:
+        """Encode texts in large batches, embedding each distinct text only once."""
+        start = time.perf_counter()
+        unique_positions: Dict[str, int] = {}
+        inverse = [unique_positions.setdefault(text, len(unique_positions)) for text in texts]
+        unique_texts = list(unique_positions)
+        # One worker per core when multi_process is set; each worker encodes whole batches on its own CPU.
+        unique_embeddings = self.encoder.encode(
+            unique_texts,
+            batch_size=self.encode_batch_size,
+            multi_process=self.multi_process,
+            num_processes=self.num_processes
+        )
+        embeddings = unique_embeddings[inverse]
+        elapsed = time.perf_counter() - start
+        print(
+            f"Encoded {len(texts)} menu items ({len(unique_texts)} unique texts) in {elapsed:.2f}s "
+            f"({len(texts) / max(elapsed, 1e-9):.1f} items/s)."
+        )
+        return embeddings
+
+    @staticmethod
+    def _embed_text(entity: Dict) -> str:
+        """Text embedded for an item. Location is left out so every outlet of a chain shares one vector."""
+        return (
+            f"{entity['restaurant_name']} {entity['section']} {entity['name']} "
+            f"{entity['description']} Dietary: {entity['dietary']}"
+        )
+
+    def _embed_with_reuse(self, texts: List[str], hashes: List[str], cached: Dict[str, np.ndarray]) -> np.ndarray:
+        """Take vectors for unchanged texts from the cache and encode only the rest."""
+        missing = [i for i, h in enumerate(hashes) if h not in cached]
+        print(f"Reusing {len(texts) - len(missing)} cached embeddings, encoding {len(missing)} new or changed items.")
+        fresh = {}
+        if missing:
+            encoded = self._encode_texts([texts[i] for i in missing])
+            fresh = {hashes[i]: vector for i, vector in zip(missing, encoded)}
+        return np.stack([cached[h] if h in cached else fresh[h] for h in hashes]).astype(np.float32)
+
+    def _build_knowledge_graph(self, cached_embeddings: Optional[Dict[str, np.ndarray]] = None):
+        entities = []
+        menuitem_indices = []
+        self.restaurant_hashes = {}
+        # One row per distinct embed text, i.e. per chain item; outlets only differ in price and location.
+        row_ids: Dict[str, int] = {}
+        row_outlets: List[List[int]] = []
         print("Starting Knowledge Graph construction...")
         for restaurant_id, details in self.data.items():
+            self.restaurant_hashes[restaurant_id] = _content_hash(details)
             rest_name_from_key, location_from_key = self._parse_key(restaurant_id)
             rest_name = details.get('restaurant_name', rest_name_from_key)
             if not rest_name:
@@ -76,7 +630,7 @@ class RestaurantKG:
                 'location': location_from_key,
                 'url': details.get('url', '')
             }
-            self.entities.append(rest_entity)
+            entities.append(rest_entity)
             for section_type in ['veg', 'non_veg']:
                 if section_type in details:
                     for section in details[section_type]:
@@ -98,120 +652,484 @@ class RestaurantKG:
                                 'dietary': 'non-veg' if item.get('is_nonveg', False) else 'veg',
                                 'location': location_from_key
                             }
-                            self.entities.append(entity)
-                            current_entity_index = len(self.entities) - 1
-                            self.menuitem_indices.append(current_entity_index)
-                            embed_text = (
-                                f"{entity['restaurant_name']} {entity['section']} {entity['name']} "
-                                f"{entity['description']} Location: {entity['location']} Dietary: {entity['dietary']}"
-                            )
-                            embedding = self.model.encode(embed_text)
-                            menuitem_embeddings.append(embedding)
-        if menuitem_embeddings:
-            menuitem_embeddings = np.array(menuitem_embeddings, dtype=np.float32)
-            dimension = menuitem_embeddings.shape[1]
-            self.index = faiss.IndexFlatL2(dimension)
-            self.index.add(menuitem_embeddings)
-            print(f"FAISS index built with {len(menuitem_embeddings)} menu items.")
+                            entities.append(entity)
+                            menuitem_indices.append(len(entities) - 1)
+                            row = row_ids.setdefault(self._embed_text(entity), len(row_ids))
+                            if row == len(row_outlets):
+                                row_outlets.append([])
+                            row_outlets[row].append(len(entities) - 1)
+        self.entities = EntityStore.from_dicts(entities)
+        self.menuitem_indices = np.asarray(menuitem_indices, dtype=np.int64)
+        self._set_rows(
+            np.concatenate([[0], np.cumsum([len(outlets) for outlets in row_outlets])]).astype(np.int64),
+            np.asarray([position for outlets in row_outlets for position in outlets], dtype=np.int64)
+        )
+        self._outdated_entities = False
+        embed_texts = list(row_ids)
+        self.item_hashes = [_content_hash(text) for text in embed_texts]
+        if embed_texts:
+            if cached_embeddings:
+                menuitem_embeddings = self._embed_with_reuse(embed_texts, self.item_hashes, cached_embeddings)
+            else:
+                menuitem_embeddings = self._encode_texts(embed_texts)
+            self.embeddings = menuitem_embeddings
+            self.index = build_index(menuitem_embeddings, self.index_spec)
+            print(
+                f"FAISS '{self.index_spec['type']}' index ({self.index_spec['storage']}) built with {len(menuitem_embeddings)} chain items "
+                f"for {len(menuitem_indices)} outlet menu items."
+            )
         else:
             self.index = None
+            self.embeddings = None
             print("Warning: No menu items found to build FAISS index.")
+        self._build_lookup_indexes()
+        self._build_lexical_index()
+        self._build_aggregates()
+        self._build_tag_index()
+        self._build_price_index()
         print("Knowledge Graph construction finished.")
 
+    def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        """(n, d) query vectors; cached ones come from the LRU, the rest are encoded in one batch."""
+        keys = [normalize_query(query) for query in queries]
+        vectors = {}
+        for key in keys:
+            if key not in vectors:
+                vector = self.query_cache.get(key)
+                if vector is not None:
+                    vectors[key] = vector
+        missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+        if missing:
+            encoded = self.encoder.encode(missing, batch_size=self.encode_batch_size)
+            for key, vector in zip(missing, encoded):
+                self.query_cache.put(key, vector)
+                vectors[key] = vector
+        return np.stack([vectors[key] for key in keys]).astype(np.float32)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """One query vector, served from the query-embedding cache when possible."""
+        return self._encode_queries([query])[0]
+
+    def prewarm_query_cache(self, queries: List[str]):
+        """Encode queries that are not cached yet in one batch and store their vectors."""
+        keys = [key for key in dict.fromkeys(normalize_query(q) for q in queries) if key not in self.query_cache]
+        if keys:
+            vectors = self.encoder.encode(keys, batch_size=self.encode_batch_size)
+            for key, vector in zip(keys, vectors):
+                self.query_cache.put(key, vector)
+        print(f"Query cache prewarmed with {len(keys)} queries.")
+
+    def query_cache_stats(self) -> Dict[str, float]:
+        return self.query_cache.stats()
+
+    def _rows_for_location(self, location_filter: str) -> np.ndarray:
+        """FAISS rows with at least one outlet in a location matching the filter, in row order."""
+        positions = self._positions_for_locations(self.location_index, location_filter)
+        return np.unique(self.entity_rows[positions])
+
+    def _location_selector(self, location_filter: str) -> Tuple[Optional["faiss.IDSelector"], int]:
+        """FAISS id selector over the rows of items in matching locations and how many rows it allows;
+        (None, n_rows) when every row matches. The main index is searched through it, so no vectors are copied."""
+        keys = tuple(self._matching_locations(location_filter))
+        with self._load_lock:
+            if keys in self._location_selectors:
+                self._location_selectors.move_to_end(keys)
+                return self._location_selectors[keys]
+            rows = np.ascontiguousarray(self._rows_for_location(location_filter), dtype=np.int64)
+            if len(rows) == self.n_rows:
+                entry = (None, self.n_rows)
+            else:
+                import faiss
+                # IDSelectorBatch keeps its own copy of the ids.
+                entry = (faiss.IDSelectorBatch(len(rows), faiss.swig_ptr(rows)), len(rows))
+            self._location_selectors[keys] = entry
+            while len(self._location_selectors) > LOCATION_SELECTOR_CACHE_SIZE:
+                self._location_selectors.popitem(last=False)
+            return entry
+
+    def _search_params(self, index: "faiss.Index", selector: Optional["faiss.IDSelector"], allowed: int, fetch: int):
+        """Per-call parameters restricting a search to `selector`. Approximate indexes widen their
+        search by the share of rows filtered out, so a small location still yields its nearest items."""
+        if selector is None:
+            return None
+        import faiss
+        widen = index.ntotal / max(allowed, 1)
+        if isinstance(index, faiss.IndexHNSW):
+            ef_search = max(int(self.index_spec['ef_search']), fetch)
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=int(min(ef_search * widen, index.ntotal)))
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            return faiss.SearchParametersIVF(sel=selector, nprobe=int(min(np.ceil(ivf.nprobe * widen), ivf.nlist)))
+        return faiss.SearchParameters(sel=selector)
+
+    def _unique_rows(self, hits: np.ndarray, k: int) -> List[int]:
+        """Keep the first k FAISS rows with distinct (restaurant, item) pairs."""
+        names = self.entities.string_codes['name']
+        restaurants = self.entities.string_codes['restaurant_name']
+        seen = set()
+        results = []
+        for row in hits:
+            if row < 0:
+                continue
+            row = int(row)
+            position = self.row_entities[self.row_offsets[row]]
+            key = (restaurants[position], names[position])
+            if key not in seen:
+                seen.add(key)
+                results.append(row)
+                if len(results) >= k:
+                    break
+        return results
+
+    def _collect_results(
+        self,
+        query_embeds: np.ndarray,
+        k: int,
+        selector: Optional["faiss.IDSelector"] = None,
+        allowed: Optional[int] = None
+    ) -> List[List[int]]:
+        """Search all queries in one call, re-searching wider only those still short of k distinct rows.
+        With a selector only its `allowed` rows are candidates."""
+        index = self.index
+        limit = min(allowed if allowed is not None else index.ntotal, index.ntotal)
+        results: List[List[int]] = [[] for _ in range(len(query_embeds))]
+        pending = list(range(len(query_embeds)))
+        fetch = min(k * 5, limit)
+        while pending and fetch > 0:
+            _, found = index.search(query_embeds[pending], fetch, params=self._search_params(index, selector, limit, fetch))
+            short = []
+            for query_position, hits in zip(pending, found):
+                results[query_position] = self._unique_rows(hits, k)
+                if len(results[query_position]) < k and fetch < limit:
+                    short.append(query_position)
+            pending = short
+            fetch = min(fetch * 2, limit)
+        return results
+
+    def _lexical_search(self, query: str, allowed: Optional[np.ndarray], k: int) -> Tuple[np.ndarray, bool]:
+        """BM25-ranked rows for a query, and whether the hit is strong enough to skip the dense search.
+
+        A hit is strong when every query term is a known token and the best
+        document contains all of them (e.g. an exact dish or brand name).
+        """
+        scores, matched, n_terms = self.bm25.score(query, allowed)
+        ranked = self.bm25.top(scores, k * 5)
+        strong = n_terms > 0 and len(ranked) > 0 and matched[ranked[0]] == n_terms
+        return ranked, strong
+
+    @staticmethod
+    def _fuse_rankings(dense: List[int], lexical: np.ndarray) -> List[int]:
+        """Reciprocal rank fusion of dense and lexical rankings of FAISS rows."""
+        scores: Dict[int, float] = {}
+        for ranking in (dense, lexical.tolist()):
+            for rank, row in enumerate(ranking):
+                scores[row] = scores.get(row, 0.0) + 1.0 / (RRF_K + rank + 1)
+        return sorted(scores, key=scores.get, reverse=True)
+
     def search(self, query: str, k=10, location_filter: Optional[str] = None) -> List[Dict]:
-        """Semantic search over menu items using FAISS index, optionally filtering by location."""
-        if not self.index or not self.menuitem_indices:
-            print("Warning: Search called but index is not available.")
+        """Hybrid lexical + semantic search over menu items, optionally filtering by location.
+
+        Queries whose terms all occur in one item (exact dish or restaurant names)
+        are answered from the BM25 index without encoding; the rest fuse the BM25
+        and FAISS rankings. With a location filter only matching items are searched,
+        so k results come back whenever the location has at least k distinct items.
+        """
+        return self.search_many([query], k=k, location_filters=[location_filter])[0]
+
+    def search_many(
+        self,
+        queries: List[str],
+        k=10,
+        location_filters: Optional[List[Optional[str]]] = None
+    ) -> List[List[Dict]]:
+        """Batch form of `search`: one encode call for the queries that need the dense search and one
+        multi-row FAISS search per distinct location filter. Returns one result list per query."""
+        if not queries:
             return []
+        if self.n_rows == 0:
+            print("Warning: Search called but the KG has no menu items.")
+            return [[] for _ in queries]
+        location_filters = location_filters or [None] * len(queries)
+        if len(location_filters) != len(queries):
+            raise ValueError("location_filters must have one entry per query.")
         try:
-            query_embed = self.model.encode(query)
-            _, relative_indices = self.index.search(np.array([query_embed], dtype=np.float32), k * 5)
-            results = []
-            for i in relative_indices[0]:
-                if 0 <= i < len(self.menuitem_indices):
-                    global_entity_index = self.menuitem_indices[i]
-                    entity = self.entities[global_entity_index]
-                    if location_filter:
-                        if location_filter.lower() not in entity.get('location', '').lower():
+            groups: Dict[Optional[str], List[int]] = {}
+            for position, location_filter in enumerate(location_filters):
+                groups.setdefault(location_filter or None, []).append(position)
+            result_rows: List[List[int]] = [[] for _ in queries]
+            lexical: Dict[int, np.ndarray] = {}
+            dense_groups: Dict[Optional[str], List[int]] = {}
+            for location_filter, positions in groups.items():
+                if location_filter and not self._matching_locations(location_filter):
+                    continue
+                allowed = None
+                if location_filter:
+                    allowed = np.zeros(self.n_rows, dtype=bool)
+                    allowed[self._rows_for_location(location_filter)] = True
+                for position in positions:
+                    if self.hybrid_search and self.bm25 is not None:
+                        ranked, strong = self._lexical_search(queries[position], allowed, k)
+                        if strong:
+                            result_rows[position] = self._unique_rows(ranked, k)
                             continue
-                    results.append(entity)
-                    if len(results) >= k:
-                        break
-            # Remove duplicates and sort by price if relevant
-            seen = set()
-            unique_results = []
-            for r in results:
-                key = (r['restaurant_name'], r['name'])
-                if key not in seen:
-                    unique_results.append(r)
-                    seen.add(key)
-            return unique_results
+                        lexical[position] = ranked
+                    dense_groups.setdefault(location_filter, []).append(position)
+            dense_positions = [position for positions in dense_groups.values() for position in positions]
+            # Only the dense search opens the (memory-mapped) FAISS index.
+            if dense_positions and self.index is None:
+                print("Warning: Search called but index is not available.")
+                for position in dense_positions:
+                    result_rows[position] = self._unique_rows(lexical.get(position, np.empty(0, dtype=np.int64)), k)
+            elif dense_positions:
+                query_embeds = self._encode_queries([queries[position] for position in dense_positions])
+                embed_rows = {position: i for i, position in enumerate(dense_positions)}
+                for location_filter, positions in dense_groups.items():
+                    selector, allowed = self._location_selector(location_filter) if location_filter else (None, None)
+                    group_embeds = query_embeds[[embed_rows[position] for position in positions]]
+                    for position, found in zip(positions, self._collect_results(group_embeds, k, selector, allowed)):
+                        if len(lexical.get(position, ())):
+                            found = self._unique_rows(self._fuse_rankings(found, lexical[position]), k)
+                        result_rows[position] = found
+            return [
+                [self._row_entity(row, location_filters[position]) for row in found]
+                for position, found in enumerate(result_rows)
+            ]
         except Exception as e:
             print(f"FAISS search error: {e}")
-            return []
+            return [[] for _ in queries]
 
-    def get_veg_options(self, restaurant_name: Optional[str] = None, location: Optional[str] = None) -> List[Dict]:
-        """Return all vegetarian menu items, optionally filtered by restaurant and/or location."""
-        veg_items = []
-        norm_rest_name = normalize_name(restaurant_name) if restaurant_name else None
-        for entity in self.entities:
-            if entity['type'] == 'MenuItem' and entity['dietary'] == 'veg':
-                if norm_rest_name and entity['normalized_restaurant_name'] != norm_rest_name:
-                    continue
-                if location and location.lower() not in entity.get('location', '').lower():
-                    continue
-                veg_items.append(entity)
-        return veg_items
+    def _page(self, positions: np.ndarray, limit: Optional[int], offset: int) -> List[Dict]:
+        """Entity views for one page of positions; only the requested rows are materialized."""
+        end = None if limit is None else offset + limit
+        return [self.entities[i] for i in positions[offset:end].tolist()]
 
-    def get_menu_items_for_restaurant(self, restaurant_name: str, location: Optional[str] = None) -> List[Dict]:
-        """Return all menu items for a given restaurant, optionally filtered by location."""
-        norm_rest_name = normalize_name(restaurant_name)
-        items = []
-        for entity in self.entities:
-            if entity['type'] == 'MenuItem' and entity['normalized_restaurant_name'] == norm_rest_name:
-                if location and location.lower() not in entity.get('location', '').lower():
-                    continue
-                items.append(entity)
-        return items
+    def _veg_positions(self, restaurant_name: Optional[str], location: Optional[str]) -> np.ndarray:
+        if restaurant_name:
+            positions = self._restaurant_positions(restaurant_name, location)
+            return positions[self.entities.dietary[positions] == DIETARY_VALUES.index('veg')]
+        return self._positions_for_locations(self.dietary_index.get('veg', {}), location)
+
+    def get_veg_options(
+        self,
+        restaurant_name: Optional[str] = None,
+        location: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: int = 0
+    ) -> List[Dict]:
+        """Return vegetarian menu items, optionally filtered by restaurant and/or location, paginated by limit/offset."""
+        return self._page(self._veg_positions(restaurant_name, location), limit, offset)
+
+    def iter_veg_options(self, restaurant_name: Optional[str] = None, location: Optional[str] = None) -> Iterator[Dict]:
+        """Lazy form of get_veg_options: entity views are created as the caller consumes them."""
+        for position in self._veg_positions(restaurant_name, location).tolist():
+            yield self.entities[position]
+
+    def get_menu_items_for_restaurant(
+        self,
+        restaurant_name: str,
+        location: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: int = 0
+    ) -> List[Dict]:
+        """Return menu items for a given restaurant, optionally filtered by location, paginated by limit/offset."""
+        return self._page(self._restaurant_positions(restaurant_name, location), limit, offset)
+
+    def iter_menu_items_for_restaurant(self, restaurant_name: str, location: Optional[str] = None) -> Iterator[Dict]:
+        """Lazy form of get_menu_items_for_restaurant."""
+        for position in self._restaurant_positions(restaurant_name, location).tolist():
+            yield self.entities[position]
+
+    def sample_menu_items(
+        self,
+        restaurant_name: str,
+        location: Optional[str] = None,
+        per_section: int = 3,
+        limit: int = 15,
+        interleave: bool = False
+    ) -> List[Dict]:
+        """A representative slice of a restaurant's menu: all items if there are at most `limit`,
+        otherwise the first `per_section` items of each section (in menu order), capped at `limit`.
+        With `interleave` the slice is rank-major (the first item of every section, then the
+        second, ...), so any prefix of it still covers every section.
+        Sampling works on positions, so only the returned items are materialized."""
+        positions = self._restaurant_positions(restaurant_name, location)
+        if len(positions) <= limit and not interleave:
+            return self._page(positions, None, 0)
+        sections = self.entities.string_codes['section'][positions]
+        _, first, inverse = np.unique(sections, return_index=True, return_inverse=True)
+        # Rank of each item within its section, then sections in order of first appearance.
+        order = np.argsort(inverse, kind='stable')
+        starts = np.searchsorted(inverse[order], np.arange(len(first)))
+        within = np.empty(len(positions), dtype=np.int64)
+        within[order] = np.arange(len(positions)) - np.repeat(starts, np.bincount(inverse))
+        picked = np.flatnonzero(within < per_section)
+        section_rank = np.argsort(np.argsort(first))[inverse[picked]]
+        if interleave:
+            picked = picked[np.lexsort((section_rank, within[picked]))]
+        else:
+            picked = picked[np.lexsort((picked, section_rank))]
+        return self._page(positions[picked], limit, 0)
 
     def get_restaurants_in_location(self, location: str) -> List[str]:
         """Returns a list of unique restaurant names found in a specific location."""
         if not location: return []
-        norm_location = location.lower()
         names = set()
-        for entity in self.entities:
-            entity_location = entity.get('location', '').lower()
-            if norm_location in entity_location:
-                name_to_add = entity.get('name') if entity.get('type') == 'Restaurant' else entity.get('restaurant_name')
-                if name_to_add:
-                    names.add(name_to_add)
+        for loc in self._matching_locations(location):
+            names.update(self.location_restaurants[loc])
         return sorted(list(names))
-    # Add this method to your RestaurantKG class
+
+    def _tagged_positions(
+        self,
+        tags: List[str] = (),
+        exclude_tags: List[str] = (),
+        restaurant_name: Optional[str] = None,
+        section: Optional[str] = None,
+        location: Optional[str] = None,
+        dietary: Optional[str] = None
+    ) -> np.ndarray:
+        """Intersect tag, restaurant, location and dietary posting lists, then filter by section."""
+        candidates = [self.tag_index.get(tag, NO_POSITIONS) for tag in tags]
+        if restaurant_name:
+            candidates.append(self._restaurant_positions(restaurant_name, location))
+        elif dietary:
+            candidates.append(self._positions_for_locations(self.dietary_index.get(dietary, {}), location))
+        elif location or not candidates:
+            candidates.append(self._positions_for_locations(self.location_index, location))
+        positions = candidates[0]
+        for other in candidates[1:]:
+            positions = np.intersect1d(positions, other, assume_unique=True)
+        if dietary and restaurant_name:
+            positions = positions[self.entities.dietary[positions] == DIETARY_VALUES.index(dietary)]
+        for tag in exclude_tags:
+            positions = np.setdiff1d(positions, self.tag_index.get(tag, NO_POSITIONS), assume_unique=True)
+        if section and len(positions):
+            # "desserts" should match a "Dessert" section.
+            positions = self.entities.filter_contains(positions, 'section', section.rstrip('s') or section)
+        return positions
+
+    def get_items_by_tags(
+        self,
+        tags: List[str],
+        restaurant_name: Optional[str] = None,
+        section: Optional[str] = None,
+        location: Optional[str] = None,
+        dietary: Optional[str] = None,
+        exclude_tags: List[str] = ()
+    ) -> List[Dict]:
+        """Menu items carrying all `tags` (e.g. ['paneer', 'spicy']) and none of `exclude_tags`,
+        optionally narrowed by restaurant, section, location and dietary ('veg' / 'non-veg')."""
+        positions = self._tagged_positions(tags, exclude_tags, restaurant_name, section, location, dietary)
+        return [self.entities[i] for i in positions.tolist()]
+
+    def get_gluten_free_items(self, restaurant_name: Optional[str] = None, section: Optional[str] = None) -> List[Dict]:
+        """Items the menu states are gluten-free."""
+        return self.get_items_by_tags(['gluten-free'], restaurant_name=restaurant_name, section=section)
+
+    def get_likely_gluten_free_items(
+        self, restaurant_name: Optional[str] = None, section: Optional[str] = None
+    ) -> List[Dict]:
+        """Items inferred to be gluten-free (rice/lentil/dairy based, no wheat or flour-coating words);
+        not confirmed by the menu, so only ever shown with a caveat."""
+        return self.get_items_by_tags(['likely-gluten-free'], restaurant_name=restaurant_name, section=section)
+
+    def query_items(
+        self,
+        restaurant_name: Optional[str] = None,
+        location: Optional[str] = None,
+        section: Optional[str] = None,
+        dietary: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        tags: List[str] = (),
+        keyword: Optional[str] = None,
+        sort: str = 'price_asc',
+        limit: Optional[int] = 10
+    ) -> List[Dict]:
+        """Structured facet query over menu items.
+
+        Starts from the narrowest price-sorted array (restaurant, then exact section,
+        then all items), binary-searches the price bounds, and filters the slice by
+        the remaining facets without leaving price order. `sort` is 'price_asc' or
+        'price_desc'; items without a price are skipped. `keyword` words must all
+        appear in the item name or section ("rolls" matches "Kathi Roll").
+        """
+        if sort not in ('price_asc', 'price_desc'):
+            raise ValueError(f"Unknown sort '{sort}', expected 'price_asc' or 'price_desc'.")
+        if restaurant_name:
+            name = normalize_name(restaurant_name)
+            if name not in self.restaurant_index:
+                name = self.name_resolver.best(restaurant_name) or name
+            positions, prices = self._price_sorted('restaurant', name)
+        elif section and section.lower() in self.price_index['section']:
+            positions, prices = self._price_sorted('section', section.lower())
+            section = None
+        else:
+            positions, prices = self._price_sorted('all', '')
+        start = np.searchsorted(prices, min_price, side='left') if min_price is not None else 0
+        # Unpriced items (0) never count as the cheapest.
+        start = max(start, np.searchsorted(prices, 0, side='right'))
+        end = np.searchsorted(prices, max_price, side='right') if max_price is not None else len(prices)
+        positions = positions[start:end]
+
+        if location and len(positions):
+            positions = self.entities.filter_location(positions, location)
+        if dietary and len(positions):
+            positions = positions[self.entities.dietary[positions] == DIETARY_VALUES.index(dietary)]
+        if section and len(positions):
+            positions = self.entities.filter_contains(positions, 'section', section.rstrip('s') or section)
+        for tag in tags:
+            positions = positions[np.isin(positions, self.tag_index.get(tag, NO_POSITIONS), assume_unique=True)]
+        for word in tokenize(keyword or ''):
+            in_name = self.entities.filter_contains(positions, 'name', word)
+            in_section = self.entities.filter_contains(positions, 'section', word)
+            positions = positions[np.isin(positions, np.union1d(in_name, in_section))]
+        if sort == 'price_desc':
+            positions = positions[::-1]
+        if limit is not None:
+            positions = positions[:limit]
+        return [self.entities[i] for i in positions.tolist()]
+
+    def get_veg_counts(self) -> Dict[str, int]:
+        """Number of vegetarian menu items per restaurant (restaurants with at least one)."""
+        return {name: count for name, count in self.restaurant_stats.column('veg').items() if count}
+
+    def get_restaurant_stats(self, restaurant_name: str) -> Optional[Dict]:
+        """Precomputed item/veg/non-veg counts, min/max price and section histogram for a restaurant.
+
+        Misspelled or partial names are resolved through the name resolver.
+        """
+        stats = self.restaurant_stats.stats(normalize_name(restaurant_name))
+        if stats is None:
+            match = self.name_resolver.best(restaurant_name)
+            stats = self.restaurant_stats.stats(match) if match else None
+        return stats
+
+    def get_location_stats(self, location: str) -> Optional[Dict]:
+        """Precomputed stats over all menu items of one indexed location."""
+        return self.location_stats.stats(location.lower())
+
     def get_price_range(self, restaurant_name: str, location: Optional[str] = None) -> str:
         """Returns the price range for a given restaurant."""
         norm_rest_name = normalize_name(restaurant_name)
-        prices = []
-        
-        for entity in self.entities:
-            if entity['type'] == 'MenuItem' and entity['normalized_restaurant_name'] == norm_rest_name:
-                if location and location.lower() not in entity.get('location', '').lower():
-                    continue
-                if entity.get('price', 0) > 0:
-                    prices.append(entity['price'])
+        if location:
+            prices = self.entities.prices[self._restaurant_positions(restaurant_name, location)]
+            prices = prices[prices > 0]
+            min_price = float(prices.min()) if len(prices) else None
+            max_price = float(prices.max()) if len(prices) else None
+        else:
+            stats = self.restaurant_stats.stats(norm_rest_name) or {}
+            min_price, max_price = stats.get('min_price'), stats.get('max_price')
         
-        if not prices:
-            exists = any(e for e in self.entities if e.get('type') == 'Restaurant' and e.get('normalized_name') == norm_rest_name)
+        if min_price is None:
+            exists = len(self.restaurant_entity_index.get(norm_rest_name, NO_POSITIONS)) > 0
             if exists:
                 loc_str = f" in {location}" if location else ""
                 return f"No price information available for {restaurant_name}{loc_str}."
             else:
                 return f"Restaurant '{restaurant_name}' not found in database."
         
-        min_price = min(prices)
-        max_price = max(prices)
-        
         loc_str = f" in {location}" if location else ""
         if min_price == max_price:
             return f"Items at {restaurant_name}{loc_str} are priced at ₹{min_price:.0f}."
         else:
-            return f"Price range for {restaurant_name}{loc_str} is ₹{min_price:.0f} - ₹{max_price:.0f}."
\ No newline at end of file
+            return f"Price range for {restaurant_name}{loc_str} is ₹{min_price:.0f} - ₹{max_price:.0f}."
@@ -0,0 +1,99 @@
+"""Pickle-free, memory-mappable storage for the KG cache.
+
+A store file is a small JSON header followed by raw, 64-byte aligned numpy
+arrays. Reading maps every array straight from the file, so processes on
+one host share the same pages and nothing is executed on load.
+
+    [8 bytes: header length][JSON header][padding][array 0][padding][array 1]...
+"""
+import json
+import os
+import struct
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+MAGIC = b"KGSTORE1"
+ALIGNMENT = 64
+
+
+def atomic_write(path: str, write: Callable[[str], None]) -> None:
+    """Write through a temp file and rename, so readers that mapped the old file keep valid pages."""
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_store(path: str, arrays: Dict[str, np.ndarray], meta: Dict = None) -> None:
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    columns = {}
+    offset = 0
+    for name, array in arrays.items():
+        columns[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps({'columns': columns, 'meta': meta or {}}).encode("utf-8")
+    data_start = _aligned(len(MAGIC) + 8 + len(header))
+
+    def write(tmp_path: str):
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+            for name, array in arrays.items():
+                f.seek(data_start + columns[name]['offset'])
+                f.write(array.tobytes())
+
+    atomic_write(path, write)
+
+
+def read_store(path: str, mmap: bool = True) -> Tuple[Dict[str, np.ndarray], Dict]:
+    """Return ({name: array}, meta); arrays are read-only memory maps unless mmap=False."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a KG store file.")
+        (header_length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_length).decode("utf-8"))
+    data_start = _aligned(len(MAGIC) + 8 + header_length)
+    arrays = {}
+    for name, column in header['columns'].items():
+        dtype = np.dtype(column['dtype'])
+        shape = tuple(column['shape'])
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.empty(shape, dtype=dtype)
+        elif mmap:
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=data_start + column['offset'], shape=shape)
+        else:
+            with open(path, "rb") as f:
+                f.seek(data_start + column['offset'])
+                arrays[name] = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+    return arrays, header['meta']
+
+
+def encode_strings(values: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Dictionary-encode strings as (codes, table offsets, UTF-8 table bytes); repeated strings are stored once."""
+    table: Dict[str, int] = {}
+    codes = np.fromiter((table.setdefault(value, len(table)) for value in values), dtype=np.int32, count=len(values))
+    encoded = [value.encode("utf-8") for value in table]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return codes, offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def encode_postings(postings: Dict[str, Sequence[int]]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """Flatten {key: positions} into (keys, CSR offsets, concatenated positions)."""
+    keys = list(postings)
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum([len(postings[key]) for key in keys], out=offsets[1:])
+    values = np.concatenate([np.asarray(postings[key], dtype=np.int64) for key in keys]) if keys else np.empty(0, np.int64)
+    return keys, offsets, values
+
+
+def decode_postings(keys: List[str], offsets: np.ndarray, values: np.ndarray) -> Dict[str, np.ndarray]:
+    """{key: positions} where each positions array is a view into `values` (no copy)."""
+    return {key: values[offsets[i]:offsets[i + 1]] for i, key in enumerate(keys)}
@@ -0,0 +1,110 @@
+"""Fuzzy restaurant-name resolution over a character-trigram index.
+
+Every restaurant is indexed under a few aliases (normalized name, without a
+leading article, without spaces), so "Good Bowl", "the-good-bowl",
+"goodbowl" and typos like "the good bwol" all resolve to the same restaurant.
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from src.utils.text_utils import normalize_name
+
+ARTICLES = ('the ', 'a ', 'an ')
+
+
+def normalize_for_matching(text: str) -> str:
+    """normalize_name plus punctuation folded to spaces ("Wendy's" and "wendy-s" -> "wendy s")."""
+    return ' '.join(re.sub(r"[^a-z0-9]+", ' ', normalize_name(text)).split())
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def name_aliases(name: str) -> List[str]:
+    """Match keys for one restaurant name."""
+    normalized = normalize_for_matching(name)
+    aliases = [normalized]
+    for article in ARTICLES:
+        if normalized.startswith(article):
+            aliases.append(normalized[len(article):])
+    aliases.extend([alias.replace(' ', '') for alias in aliases])
+    return [alias for alias in dict.fromkeys(aliases) if alias]
+
+
+class RestaurantNameResolver:
+    """Ranks known restaurant names against a (possibly misspelled or partial) name."""
+
+    def __init__(self, names: Iterable[str], aliases: Optional[Dict[str, List[str]]] = None):
+        self.names: List[str] = list(dict.fromkeys(names))
+        self.alias_names: List[int] = []
+        self.alias_texts: List[str] = []
+        self.alias_grams: List[Set[str]] = []
+        self.exact: Dict[str, int] = {}
+        self.gram_index: Dict[str, List[int]] = {}
+        for name_id, name in enumerate(self.names):
+            keys = name_aliases(name)
+            for extra in (aliases or {}).get(name, []):
+                keys.extend(name_aliases(extra))
+            for alias in dict.fromkeys(keys):
+                alias_id = len(self.alias_texts)
+                grams = trigrams(alias)
+                self.alias_names.append(name_id)
+                self.alias_texts.append(alias)
+                self.alias_grams.append(grams)
+                self.exact.setdefault(alias, name_id)
+                for gram in grams:
+                    self.gram_index.setdefault(gram, []).append(alias_id)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _shared_grams(self, grams: Set[str]) -> Dict[int, int]:
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for alias_id in self.gram_index.get(gram, ()):
+                shared[alias_id] = shared.get(alias_id, 0) + 1
+        return shared
+
+    def resolve(self, query: str, limit: int = 5, min_score: float = 0.55) -> List[Tuple[str, float]]:
+        """Best-first (name, score) candidates; 1.0 is an exact alias match.
+
+        The score is the trigram Dice coefficient, raised for names that contain
+        the query as whole words ("faasos" -> "signature wraps rolls by faasos").
+        """
+        text = normalize_for_matching(query)
+        if not text:
+            return []
+        if text in self.exact:
+            return [(self.names[self.exact[text]], 1.0)]
+        grams = trigrams(text)
+        best: Dict[int, float] = {}
+        for alias_id, shared in self._shared_grams(grams).items():
+            alias = self.alias_texts[alias_id]
+            score = 2 * shared / (len(grams) + len(self.alias_grams[alias_id]))
+            if f" {text} " in f" {alias} ":
+                score = max(score, 0.5 + 0.5 * len(text) / len(alias))
+            name_id = self.alias_names[alias_id]
+            if score >= min_score and score > best.get(name_id, 0.0):
+                best[name_id] = score
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        return [(self.names[name_id], score) for name_id, score in ranked[:limit]]
+
+    def best(self, query: str, min_score: float = 0.55) -> Optional[str]:
+        candidates = self.resolve(query, limit=1, min_score=min_score)
+        return candidates[0][0] if candidates else None
+
+    def mentions(self, text: str) -> List[str]:
+        """Restaurant names spelled out (as whole words) anywhere in a longer text, longest first."""
+        normalized = normalize_for_matching(text)
+        padded = f" {normalized} "
+        grams = trigrams(normalized)
+        found: Dict[int, int] = {}
+        for alias_id, shared in self._shared_grams(grams).items():
+            alias = self.alias_texts[alias_id]
+            # Every trigram of the alias except its word-boundary padding must occur in the text.
+            if shared >= len(self.alias_grams[alias_id]) - 2 and f" {alias} " in padded:
+                name_id = self.alias_names[alias_id]
+                found[name_id] = max(found.get(name_id, 0), len(alias))
+        return [self.names[name_id] for name_id, _ in sorted(found.items(), key=lambda item: item[1], reverse=True)]
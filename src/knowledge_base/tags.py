@@ -0,0 +1,78 @@
+"""Dietary / ingredient tags and nutrition values extracted from menu text.
+
+Runs once per item at KG build time over the item name and its cleaned
+description. Tags feed an inverted index (tag -> item positions) so allergen
+and diet filters are set intersections instead of description scans.
+"""
+import re
+from typing import List, Optional, Tuple
+
+# Ingredients / dishes that almost always contain wheat gluten.
+WHEAT_PATTERN = re.compile(
+    r"\b(?:wheat|maida|atta|semolina|suji|rava|bread|breads|bun|buns|naan|roti|rotis|paratha|parathas|kulcha|"
+    r"bhature|puri|pizza|pizzas|pasta|burger|burgers|wrap|wraps|roll|rolls|sandwich|sandwiches|noodle|noodles|"
+    r"cake|cakes|brownie|brownies|cookie|cookies|pastry|pastries|croissant|momo|momos|garlic bread|haleem|"
+    r"biscuit|biscuits|crouton|croutons|sub|tortilla|lasagna|pie|waffle|waffles|pancake|pancakes|"
+    r"chapati|chapatis|chapathi|phulka|bhatura|bhaturas|poori|pooris|puris|samosa|samosas|kachori|kachoris|"
+    r"jalebi|jalebis|gulab jamun|gulab jamuns|manchurian|crumb|crumbs|crumbed|breaded|batter|battered|tempura)\b"
+)
+# Not wheat-based by definition, but often coated, bound or thickened with flour: never inferred gluten-free.
+GLUTEN_RISK_PATTERN = re.compile(
+    r"\b(?:crispy|crunchy|coated|fried|falafel|kebab|kebabs|kabab|kababs|tikki|tikkis|cutlet|cutlets|"
+    r"nugget|nuggets|pakora|pakoras|fritter|fritters|soya sauce|soy sauce|malt|barley|oats|beer|"
+    r"combo|combos|thali|platter|meal|starter|dessert)\b"
+)
+# Dishes built on a naturally gluten-free base (rice, lentils, dairy drinks...); with no wheat or
+# risk word they are tagged likely-gluten-free, which is an inference and never an allergen guarantee.
+GLUTEN_FREE_BASE_PATTERN = re.compile(
+    r"\b(?:rice|biryani|pulao|khichdi|dal|rajma|salad|raita|lassi|chaas|millet|quinoa|idli|dosa|sabudana)\b"
+)
+TAG_PATTERNS = {
+    'egg': re.compile(r"\b(?:egg|eggs|omelette|omelet|anda)\b"),
+    'paneer': re.compile(r"\bpaneer\b"),
+    'spicy': re.compile(r"\b(?:spicy|fiery|peri peri|piri piri|schezwan|szechuan|jalapeno|jalapenos|chilli|chili|"
+                        r"extra hot|hot (?:and |& )?(?:sour|garlic|sauce|wings))\b"),
+    'cheese': re.compile(r"\b(?:cheese|cheesy|mozzarella|cheddar)\b"),
+}
+EXPLICIT_GLUTEN_FREE_PATTERN = re.compile(r"\bgluten[\s\-]?free\b")
+
+KCAL_PATTERNS = (
+    re.compile(r"(\d+(?:\.\d+)?)\s*kcal"),
+    re.compile(r"\b(?:energy|calories)\s*(?:kcals?)?\s*-?\s*(\d+(?:\.\d+)?)"),
+)
+PROTEIN_PATTERN = re.compile(r"\bproteins?\s*(?:gms?|g)?\s*-?\s*(\d+(?:\.\d+)?)")
+HIGH_PROTEIN_GRAMS = 20.0
+
+TAGS = ('gluten-free', 'likely-gluten-free', 'contains-wheat', 'high-protein') + tuple(TAG_PATTERNS)
+
+
+def _first_number(patterns, text: str) -> Optional[float]:
+    for pattern in patterns:
+        m = pattern.search(text)
+        if m:
+            return float(m.group(1))
+    return None
+
+
+def parse_nutrition(text: str) -> Tuple[Optional[float], Optional[float]]:
+    """(kcal, protein grams) from cleaned menu text such as 'energy 649 kcal, ... protein 17g'."""
+    return _first_number(KCAL_PATTERNS, text), _first_number((PROTEIN_PATTERN,), text)
+
+
+def extract_tags(name: str, description: str) -> List[str]:
+    """Tags for one item; `description` is expected to be clean_text'd (lowercase, no brackets)."""
+    text = f"{name.lower()} {description}"
+    tags = []
+    explicit_gluten_free = bool(EXPLICIT_GLUTEN_FREE_PATTERN.search(text))
+    contains_wheat = not explicit_gluten_free and bool(WHEAT_PATTERN.search(text))
+    if explicit_gluten_free:
+        tags.append('gluten-free')
+    elif not contains_wheat and not GLUTEN_RISK_PATTERN.search(text) and GLUTEN_FREE_BASE_PATTERN.search(text):
+        tags.append('likely-gluten-free')
+    if contains_wheat:
+        tags.append('contains-wheat')
+    _, protein = parse_nutrition(text)
+    if protein is not None and protein >= HIGH_PROTEIN_GRAMS:
+        tags.append('high-protein')
+    tags.extend(tag for tag, pattern in TAG_PATTERNS.items() if pattern.search(text))
+    return tags
@@ -1,194 +1,182 @@
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 from langchain_core.retrievers import BaseRetriever
 from langchain_core.callbacks import CallbackManagerForRetrieverRun
 from langchain_core.documents import Document
-import re
 from src.knowledge_base.kg_builder import RestaurantKG
+from src.retrieval.query_analyzer import QueryAnalysis, QueryAnalyzer
+from src.utils.text_utils import estimate_tokens, truncate_to_tokens
+
+# Menu and veg lookups fetch at most this many ranked candidates; the token budget decides how many are used.
+MAX_CANDIDATES = 40
+
+
+def _group_header(restaurant: str, location: str) -> str:
+    return f"Restaurant: {restaurant} | Location: {location}"
+
+
+def _item_line(item: dict, description: str) -> str:
+    line = f"- {item.get('name', 'N/A')} | {item.get('section', 'N/A')} | ₹{item.get('price', 0):.0f} | {item.get('dietary', 'N/A')}"
+    return f"{line} | {description}" if description else line
+
+
+def _description_allowance(lengths: List[int], available: int, cap: int) -> List[int]:
+    """Split `available` tokens over descriptions, shortest first, so what short ones leave goes to longer ones."""
+    allowance = [0] * len(lengths)
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    for n, i in enumerate(order):
+        share = max(available, 0) // (len(order) - n)
+        allowance[i] = min(lengths[i], share, cap)
+        available -= allowance[i]
+    return allowance
+
 
 class KGRetriever(BaseRetriever):
     """Retriever that uses the RestaurantKG for semantic and direct lookup."""
     
     kg: RestaurantKG
     k: int = 10  # Default number of documents to retrieve
+    analyzer: Optional[QueryAnalyzer] = None  # Shared with the chatbot so each message is parsed once
+    context_token_budget: int = 1500  # Approximate tokens of item context handed to the LLM per request
+    max_description_tokens: int = 60  # Cap per item description, even when the budget has room
     
-    def _extract_location(self, query: str) -> Optional[str]:
-        """Extract location from query using improved patterns."""
-        patterns = [
-            r'(?:in|at|near)\s+([\w\s\-&\']+?)(?:\s+(?:area|locality|region|zone))',  # With area terms
-            r'(?:in|at|near)\s+([\w\s\-&\']+?)(?:\?|$|\.|\s+menu|\s+restaurant)',     # Standard pattern with boundaries
-            r'(?:in|at|near)\s+the\s+([\w\s\-&\']+?)(?:\s|\?|$|\.)',                  # With "the" included
-        ]
-        
-        for pattern in patterns:
-            m = re.search(pattern, query, re.IGNORECASE)
-            if m:
-                location = m.group(1).strip()
-                # Validate: Avoid matching restaurant names as locations
-                if "biryani" in location.lower() or "bowl" in location.lower() or "faasos" in location.lower():
-                    continue
-                return location
-        return None
+    def _get_analyzer(self) -> QueryAnalyzer:
+        if self.analyzer is None:
+            self.analyzer = QueryAnalyzer(self.kg)
+        return self.analyzer
 
-    def _extract_restaurant(self, query: str) -> Optional[str]:
-        """Extract restaurant name using multiple patterns for robustness."""
-        patterns = [
-            r'(?:dishes|items|food)\s+(?:in|at|from|of)\s+([\w\s\-&\'\.]+?)(?:\s+menu|\s+restaurant|\?|$|\.)',  # "dishes in X"
-            r'([\w\s\-&\'\.]+?)(?:\s+menu|\s+dishes|\s+restaurant|\s+food)(?:\s|\?|$|\.)',  # "X menu"
-            r'(?:about|tell me about)\s+([\w\s\-&\'\.]+?)(?:\s+menu|\s+restaurant|\s+food|\?|$|\.)',  # "about X"
-            r'(?:about|tell me about)\s+([\w\s\-&\'\.]+)',  
-        ]
-        
-        for pattern in patterns:
-            m = re.search(pattern, query, re.IGNORECASE)
-            if m:
-                restaurant = m.group(1).strip()
-                # Remove articles and common prefixes
-                restaurant = re.sub(r'^(?:the|a|an)\s+', '', restaurant, flags=re.IGNORECASE)
-                return restaurant
-        return None
-
-    def _is_vegetarian_query(self, query: str) -> bool:
-        """Check if query is asking about vegetarian options."""
-        lower_query = query.lower()
-        
-        # First check if it's explicitly non-vegetarian
-        if ('non-veg' in lower_query or 
-            'non veg' in lower_query or
-            'nonveg' in lower_query):
-            print(">>> Detected non-vegetarian query")  # Added debug print
-            return False
-            
-        # More carefully check vegetarian patterns to avoid matching "non veg food" as "veg food"
-        veg_patterns = [
-            r'\bvegetarian\b',
-            r'\bveg\s+option',
-            r'\bveg\s+food',
-            r'\bveg\s+dish'
-        ]
-        
-        for pattern in veg_patterns:
-            if re.search(pattern, lower_query):
-                return True
-        
-        return False
-
-    def _is_menu_query(self, query: str) -> bool:
-        """Check if query is asking about a restaurant's menu."""
-        lower_query = query.lower()
-        return ('menu' in lower_query or 
-                'dish' in lower_query or 
-                'what do they serve' in lower_query or 
-                'what do they offer' in lower_query)
-    
-    def _get_relevant_documents(
-        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
-    ) -> List[Document]:
-        """Retrieve relevant documents from the RestaurantKG."""
+    def _analyze_query(self, query: str) -> QueryAnalysis:
+        """Categorize the query and extract the entities it mentions (memoized per query)."""
         print(f"\n>>> Processing query: '{query}'")
-        
-        # STEP 1: Categorize the query
-        is_veg_query = self._is_vegetarian_query(query)
-        is_menu_query = self._is_menu_query(query)
-        
-        # STEP 2: Extract entities from query
-        location = self._extract_location(query)
-        restaurant_name = self._extract_restaurant(query) if is_menu_query else None
-        
-        print(f">>> Query analysis: vegetarian={is_veg_query}, menu={is_menu_query}")
-        print(f">>> Extracted: restaurant='{restaurant_name}', location='{location}'")
-        
-        # STEP 3: Retrieve relevant items based on query type
-        items = []
+        analysis = self._get_analyzer().analyze(query)
+        print(f">>> Query analysis: vegetarian={analysis.is_veg_query}, menu={analysis.is_menu_query}")
+        print(f">>> Extracted: restaurant='{analysis.menu_restaurant}', location='{analysis.location}'")
+        return analysis
+
+    def _lookup_items(self, analysis: QueryAnalysis) -> Optional[List[dict]]:
+        """Direct KG lookups for menu and vegetarian queries; None means use general semantic search."""
+        is_veg_query = analysis.is_veg_query
+        is_menu_query = analysis.is_menu_query
+        location = analysis.location
+        restaurant_name = analysis.menu_restaurant
         
         # Case 1: Restaurant Menu Query
         if is_menu_query and restaurant_name:
-            # Direct lookup by restaurant name
-            items = self.kg.get_menu_items_for_restaurant(restaurant_name, location=location)
+            # Direct lookup by restaurant name, sections interleaved so any prefix covers the whole menu
+            items = self._sample_menu(restaurant_name, location)
             print(f">>> Direct restaurant lookup found {len(items)} items for '{restaurant_name}'")
             
-            # Try with normalized name if needed
+            # Fuzzy name match (typos, slugs, partial names) if still no results
             if not items:
-                normalized_name = restaurant_name.lower().replace('-', ' ').replace('_', ' ')
-                print(f">>> Trying with normalized name: '{normalized_name}'")
-                items = self.kg.get_menu_items_for_restaurant(normalized_name, location=location)
-                print(f">>> Normalized lookup found {len(items)} items")
-            
-            # Try a partial match if still no results
-            if not items:
-                print(f">>> No direct match, trying partial name matching")
-                for entity in self.kg.entities:
-                    if (entity['type'] == 'Restaurant' and 
-                        restaurant_name.lower() in entity['name'].lower()):
-                        print(f">>> Found partial match: {entity['name']}")
-                        items = self.kg.get_menu_items_for_restaurant(entity['name'], location=location)
-                        if items:
-                            break
-                print(f">>> Partial matching found {len(items)} items")
+                print(f">>> No direct match, trying fuzzy name matching")
+                for candidate in self.kg.resolve_restaurant(restaurant_name):
+                    print(f">>> Found fuzzy match: {candidate}")
+                    items = self._sample_menu(candidate, location)
+                    if items:
+                        break
+                print(f">>> Fuzzy matching found {len(items)} items")
             
             # Final fallback to semantic search
             if not items:
                 print(">>> All direct lookups failed, using semantic search")
                 items = self.kg.search(f"{restaurant_name} menu items", k=self.k*2)
+            return items
         
         # Case 2: Vegetarian Options Query
-        elif is_veg_query:
-            items = self.kg.get_veg_options(location=location)
+        if is_veg_query:
+            # Only as many veg items as could ever be packed are fetched
+            items = self.kg.get_veg_options(location=location, limit=MAX_CANDIDATES)
             print(f">>> Vegetarian query found {len(items)} items")
             
-            # If no items found or too many, limit or try semantic search
-            if len(items) > 20:
-                items = items[:20]  # Limit to 20 items
-            elif not items:
+            # If no items found, try semantic search
+            if not items:
                 print(">>> No veg items found, trying semantic search")
                 items = self.kg.search("vegetarian dishes", k=self.k)
+            return items
         
-        # Case 3: General Query
-        else:
-            items = self.kg.search(query, k=self.k, location_filter=location)
-            print(f">>> General semantic search found {len(items)} items")
-        
-        # STEP 4: Convert items to documents
-        # STEP 4: Convert items to documents (existing code)
-        documents = []
+        # Case 3: General Query, answered by semantic search in the caller
+        return None
+
+    def _sample_menu(self, restaurant_name: str, location: Optional[str]) -> List[dict]:
+        return self.kg.sample_menu_items(
+            restaurant_name, location=location, per_section=MAX_CANDIDATES, limit=MAX_CANDIDATES, interleave=True
+        )
+
+    def _build_documents(self, items: List[dict]) -> List[Document]:
+        """Pack ranked KG items into one compact document per restaurant/location within the token budget.
+
+        Items are taken best first while their bare lines (name, section, price,
+        dietary) fit; the tokens left over are shared out as truncated descriptions.
+        An item listed again under another section (same name and price) is packed once.
+        """
+        budget = self.context_token_budget
+        groups: Dict[Tuple[str, str], List[dict]] = {}
+        seen = set()
+        used = 0
         for item in items:
-            content = (
-                f"Restaurant: {item.get('restaurant_name', 'N/A')}\n"
-                f"Location: {item.get('location', 'N/A')}\n"
-                f"Item: {item.get('name', 'N/A')}\n"
-                f"Section: {item.get('section', 'N/A')}\n"
-                f"Price: ₹{item.get('price', 0):.0f}\n"
-                f"Dietary: {item.get('dietary', 'N/A')}\n"
-                f"Description: {item.get('description', 'N/A')}"
-            )
+            key = (item.get('restaurant_name', 'N/A'), item.get('location', 'N/A'))
+            identity = key + (item.get('name', 'N/A'), item.get('price'))
+            if identity in seen:
+                continue
+            seen.add(identity)
+            cost = estimate_tokens(_item_line(item, '')) + (0 if key in groups else estimate_tokens(_group_header(*key)))
+            if used + cost > budget:
+                break
+            groups.setdefault(key, []).append(item)
+            used += cost
+        packed = [item for group in groups.values() for item in group]
+        # " | " before a description costs about one token.
+        lengths = [estimate_tokens(item.get('description') or '') + 1 for item in packed]
+        allowance = iter(_description_allowance(lengths, budget - used, self.max_description_tokens + 1))
+
+        documents = []
+        total = 0
+        for (restaurant, location), group in groups.items():
+            lines = [_group_header(restaurant, location)]
+            for item in group:
+                lines.append(_item_line(item, truncate_to_tokens(item.get('description') or '', next(allowance) - 1)))
+            tokens = sum(estimate_tokens(line) for line in lines)
+            total += tokens
             metadata = {
-                'restaurant_name': item.get('restaurant_name', 'N/A'),
-                'item_name': item.get('name', 'N/A'),
-                'price': item.get('price', 0),
-                'section': item.get('section', 'N/A'),
-                'dietary': item.get('dietary', 'N/A'),
-                'location': item.get('location', 'N/A'),
-                'id': item.get('id', 'N/A')
+                'restaurant_name': restaurant,
+                'location': location,
+                'item_names': [item.get('name', 'N/A') for item in group],
+                'ids': [item.get('id', 'N/A') for item in group],
+                'tokens': tokens
             }
-            documents.append(Document(page_content=content, metadata=metadata))
-
-        # ADD THIS TOKEN LIMITING CODE:
-        if is_menu_query and len(documents) > 15:
-            print(f">>> Too many items ({len(documents)}), sampling representative items...")
-            # Group by section
-            sections = {}
-            for doc in documents:
-                section = doc.metadata['section'] 
-                if section not in sections:
-                    sections[section] = []
-                sections[section].append(doc)
-            
-            # Take a few items from each section
-            sampled_docs = []
-            for section, docs in sections.items():
-                sampled_docs.extend(docs[:3])  # Take up to 3 items per section
-            
-            documents = sampled_docs[:15]  # Take at most 15 total
-            print(f">>> Reduced to {len(documents)} representative items")
+            documents.append(Document(page_content="\n".join(lines), metadata=metadata))
+
+        print(
+            f">>> Packed {len(packed)} of {len(seen)} distinct items into {len(documents)} documents, "
+            f"~{total} tokens (budget {budget})\n"
+        )
+        return documents
 
-        print(f">>> Returning {len(documents)} documents for LLM context\n")
-        return documents
\ No newline at end of file
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        """Retrieve relevant documents from the RestaurantKG."""
+        analysis = self._analyze_query(query)
+        items = self._lookup_items(analysis)
+        
+        # Case 3: General Query
+        if items is None:
+            items = self.kg.search(query, k=self.k, location_filter=analysis.location)
+            print(f">>> General semantic search found {len(items)} items")
+        return self._build_documents(items)
+
+    def retrieve_many(self, queries: List[str]) -> List[List[Document]]:
+        """Batched retrieval for evaluation jobs: every query that falls through to general
+        semantic search is answered by a single kg.search_many call."""
+        analyses = [self._analyze_query(query) for query in queries]
+        items_per_query = [self._lookup_items(analysis) for analysis in analyses]
+        general = [i for i, items in enumerate(items_per_query) if items is None]
+        if general:
+            results = self.kg.search_many(
+                [queries[i] for i in general],
+                k=self.k,
+                location_filters=[analyses[i].location for i in general]
+            )
+            for i, items in zip(general, results):
+                items_per_query[i] = items
+            print(f">>> Batched semantic search answered {len(general)} of {len(queries)} queries")
+        return [self._build_documents(items) for items in items_per_query]
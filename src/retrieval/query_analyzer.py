@@ -0,0 +1,353 @@
+"""Single-pass analysis of a user message, shared by the web app, chatbot and retriever.
+
+All patterns are compiled once at import. `QueryAnalyzer.analyze` scans the
+message once for routing keywords, extracts restaurant / section / location /
+dietary / comparison fields and memoizes the result per query string, so the
+app, the chatbot router and the retriever all read the same `QueryAnalysis`
+instead of re-parsing the message.
+"""
+import re
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+from typing import TYPE_CHECKING, Container, Dict, FrozenSet, Optional, Tuple
+
+from src.knowledge_base.bm25 import tokenize
+
+if TYPE_CHECKING:
+    from src.knowledge_base.kg_builder import RestaurantKG
+
+# Keywords matched at a word start ("offer" also matches "offers"), and short words matched whole.
+STEM_KEYWORDS = (
+    'appetizer', 'dessert', 'dish', 'item', 'offer', 'serve', 'menu', 'compare', 'between',
+    'vegetarian', 'best', 'most', 'price', 'range', 'gluten', 'have', 'what'
+)
+WORD_KEYWORDS = ('and', 'for', 'of', 'at', 'in', 'any')
+KEYWORD_PATTERN = re.compile(
+    r"\b(?:(" + "|".join(WORD_KEYWORDS) + r")\b|(" + "|".join(sorted(STEM_KEYWORDS, key=len, reverse=True)) + r"))"
+)
+
+NON_VEG_PATTERN = re.compile(r"non-veg|non veg|nonveg")
+VEG_PATTERN = re.compile(r"\bvegetarian\b|\bveg\s+option|\bveg\s+food|\bveg\s+dish")
+MENU_PATTERN = re.compile(r"menu|dish|what do they serve|what do they offer")
+
+LOCATION_PATTERNS = (
+    re.compile(r"(?:in|at|near)\s+([\w\s\-&']+?)(?:\s+(?:area|locality|region|zone))", re.IGNORECASE),
+    re.compile(r"(?:in|at|near)\s+([\w\s\-&']+?)(?:\?|$|\.|\s+menu|\s+restaurant)", re.IGNORECASE),
+    re.compile(r"(?:in|at|near)\s+the\s+([\w\s\-&']+?)(?:\s|\?|$|\.)", re.IGNORECASE),
+)
+# Words that mark a captured "location" as really being a restaurant name.
+NOT_LOCATION_WORDS = ('biryani', 'bowl', 'faasos')
+
+MENU_RESTAURANT_PATTERNS = (
+    re.compile(r"(?:dishes|items|food)\s+(?:in|at|from|of)\s+([\w\s\-&'\.]+?)(?:\s+menu|\s+restaurant|\?|$|\.)", re.IGNORECASE),
+    re.compile(r"([\w\s\-&'\.]+?)(?:\s+menu|\s+dishes|\s+restaurant|\s+food)(?:\s|\?|$|\.)", re.IGNORECASE),
+    re.compile(r"(?:about|tell me about)\s+([\w\s\-&'\.]+?)(?:\s+menu|\s+restaurant|\s+food|\?|$|\.)", re.IGNORECASE),
+    re.compile(r"(?:about|tell me about)\s+([\w\s\-&'\.]+)", re.IGNORECASE),
+)
+LEADING_ARTICLE_PATTERN = re.compile(r"^(?:the|a|an)\s+", re.IGNORECASE)
+
+RESTAURANT_SECTION_PATTERNS = (
+    re.compile(r"(?:price range|gluten-free)\s+(?:for|at|in)\s+([\w\s\-&]+?)(?:'s)?(?:\s+([\w\s]+?))?\s*(?:menu)?$"),
+    re.compile(r"(?:gluten-free|price range)\s+([\w\s]+?)\s+(?:at|for)\s+([\w\s\-&]+)$"),
+)
+SECTION_PATTERN = re.compile(r"\b(dessert|appetizer|main|drink|starter)s?\b", re.IGNORECASE)
+CAPITALIZED_PATTERN = re.compile(r"\b[A-Z][\w\s\-&'\.]+\b")
+
+COMPARE_MENUS_PATTERN = re.compile(r"menus? of ([\w\s&]+) and ([\w\s&]+)", re.IGNORECASE)
+COMPARE_PATTERN = re.compile(r"compare (?:between )?(.+?) and (.+)")
+COMPARE_KEYWORD_PATTERN = re.compile(r"compare the ([\w\s]+) mentioned", re.IGNORECASE)
+KEYWORD_BEFORE_PATTERN = re.compile(r"([a-zA-Z0-9\-]+) (?:dishes|mentioned)", re.IGNORECASE)
+APPETIZER_RESTAURANT_PATTERN = re.compile(r"does (.+?) offer")
+PRICE_TARGET_PATTERN = re.compile(r"price range (?:for|of|at) (.+)")
+
+# Price facets: "under ₹200", "above 300", "between 100 and 250", "cheapest", "top 5 most expensive".
+AMOUNT = r"(?:₹|rs\.?\s*|inr\s*)?(\d+(?:\.\d+)?)(?!\s*(?:kcal|cal\b|calories|g\b|gm|grams|items?\b|people|persons|min\b|minutes|serves))"
+MAX_PRICE_PATTERN = re.compile(r"\b(?:under|below|less than|within|up ?to|max(?:imum)?|not more than|cheaper than)\s*" + AMOUNT)
+MIN_PRICE_PATTERN = re.compile(r"\b(?:above|over|more than|at least|min(?:imum)?|costlier than)\s*" + AMOUNT)
+PRICE_BETWEEN_PATTERN = re.compile(
+    r"\bbetween\s*" + AMOUNT + r"\s*(?:and|to|-)\s*" + AMOUNT + r"|(?:₹|rs\.?\s*)(\d+)\s*(?:-|to)\s*(?:₹|rs\.?\s*)?(\d+)"
+)
+CHEAPEST_PATTERN = re.compile(r"\b(?:cheapest|lowest[\s\-]price[sd]?|least expensive|most affordable|lowest cost)\b")
+PRICIEST_PATTERN = re.compile(r"\b(?:most expensive|priciest|costliest|highest[\s\-]price[sd]?)\b")
+LIMIT_PATTERN = re.compile(r"\b(?:top|first)\s+(\d+)\b|\b(\d+)\s+(?:cheapest|most expensive|priciest)\b")
+FACET_NON_VEG_PATTERN = re.compile(r"\bnon[\s\-]?veg")
+FACET_VEG_PATTERN = re.compile(r"\b(?:veg|vegetarian)\b")
+# Words of a price query that are not part of the dish keyword.
+FACET_WORDS = frozenset("""
+lowest cheapest cheap price priced least expensive most affordable budget highest priciest costliest cost costing
+under below less than within upto up max maximum above over more min minimum between rs rupee inr top first
+veg vegetarian non nonveg pure order buy find list restaurant whats one
+suggest recommend good best nice something anything thing things eat should could
+""".split())
+
+
+@dataclass(frozen=True)
+class PriceQuery:
+    """Facets of a price question, ready for RestaurantKG.query_items."""
+    min_price: Optional[float]
+    max_price: Optional[float]
+    sort: str
+    limit: int
+    location: Optional[str]
+    dietary: Optional[str]
+    keyword: Optional[str]
+    # Matching items, already fetched when the keyword had to be checked against the KG.
+    items: Optional[Tuple[Dict, ...]] = field(default=None, compare=False, repr=False)
+
+
+@dataclass(frozen=True)
+class QueryAnalysis:
+    """Everything the routing layers need to know about one message."""
+    query: str
+    keywords: FrozenSet[str]
+    # Chatbot route: desc_compare, veg_comparison, price_range, gluten_free_specific,
+    # gluten_free_general, price_query, availability_rag or general_rag.
+    intent: str
+    # Web app route: appetizers, veg_comparison, gluten, price_range, price_query, compare or rag.
+    app_intent: str
+    restaurant: Optional[str]
+    section: Optional[str]
+    location: Optional[str]
+    dietary: Optional[str]
+    is_menu_query: bool
+    # Raw restaurant name of a menu query ("Faasos menu"), looked up by the retriever.
+    menu_restaurant: Optional[str]
+    # Free-text target of the app's appetizer / price-range questions.
+    target: Optional[str]
+    compare_restaurants: Tuple[str, ...]
+    compare_keyword: Optional[str]
+    # Set for "cheapest ..." / "under ₹200" questions (intent and app route 'price_query').
+    price_query: Optional[PriceQuery] = None
+
+    @property
+    def is_veg_query(self) -> bool:
+        return self.dietary == 'veg'
+
+
+def _keywords(lower: str) -> FrozenSet[str]:
+    return frozenset(word or stem for word, stem in KEYWORD_PATTERN.findall(lower))
+
+
+def _dietary(lower: str) -> Optional[str]:
+    if NON_VEG_PATTERN.search(lower):
+        return 'non-veg'
+    if VEG_PATTERN.search(lower):
+        return 'veg'
+    return None
+
+
+def _location(query: str) -> Optional[str]:
+    for pattern in LOCATION_PATTERNS:
+        m = pattern.search(query)
+        if m:
+            location = m.group(1).strip()
+            if any(word in location.lower() for word in NOT_LOCATION_WORDS):
+                continue
+            return location
+    return None
+
+
+def _menu_restaurant(query: str) -> Optional[str]:
+    for pattern in MENU_RESTAURANT_PATTERNS:
+        m = pattern.search(query)
+        if m:
+            return LEADING_ARTICLE_PATTERN.sub('', m.group(1).strip())
+    return None
+
+
+def _compare_keyword(query: str) -> Optional[str]:
+    keyword = None
+    m = COMPARE_KEYWORD_PATTERN.search(query)
+    if m:
+        words = m.group(1).strip().split()
+        keyword = words[-1]
+        if keyword in ['levels', 'options']: keyword = words[-2]
+        if keyword == 'dishes' and len(words) > 1: keyword = words[-2]
+        if keyword in ['the', 'a', 'an']: keyword = words[-2] if len(words) > 1 else None
+    if not keyword and 'spice' in query.lower(): keyword = 'spice'
+    if not keyword:
+        m = KEYWORD_BEFORE_PATTERN.search(query)
+        if m: keyword = m.group(1)
+    return keyword.lower() if keyword else None
+
+
+def _price_query(
+    lower: str,
+    location: Optional[str],
+    drop_words: Tuple[str, ...],
+    vocabulary: Optional[Container[str]] = None
+) -> Optional[PriceQuery]:
+    """Price bounds, order and dish keyword of a price question; None if the message has none.
+
+    Keyword words must be longer than one letter and, given a `vocabulary`, occur in the menu text.
+    """
+    min_price = max_price = None
+    m = PRICE_BETWEEN_PATTERN.search(lower)
+    if m:
+        low, high = [float(v) for v in m.groups() if v is not None]
+        min_price, max_price = min(low, high), max(low, high)
+    else:
+        m = MAX_PRICE_PATTERN.search(lower)
+        max_price = float(m.group(1)) if m else None
+        m = MIN_PRICE_PATTERN.search(lower)
+        min_price = float(m.group(1)) if m else None
+    descending = bool(PRICIEST_PATTERN.search(lower))
+    if min_price is None and max_price is None and not descending and not CHEAPEST_PATTERN.search(lower):
+        return None
+    m = LIMIT_PATTERN.search(lower)
+    limit = int(m.group(1) or m.group(2)) if m else 10
+    dietary = 'non-veg' if FACET_NON_VEG_PATTERN.search(lower) else 'veg' if FACET_VEG_PATTERN.search(lower) else None
+    # Each word of the restaurant / location name is dropped once, so "biryani at Behrouz Biryani" keeps "biryani".
+    unused = list(drop_words)
+    words = []
+    for word in tokenize(lower):
+        if word in unused:
+            unused.remove(word)
+        elif word not in FACET_WORDS and not word.isdigit() and len(word) > 1:
+            if vocabulary is None or word in vocabulary:
+                words.append(word)
+    return PriceQuery(
+        min_price=min_price,
+        max_price=max_price,
+        sort='price_desc' if descending else 'price_asc',
+        limit=limit,
+        location=location,
+        dietary=dietary,
+        keyword=' '.join(words) or None
+    )
+
+
+class QueryAnalyzer:
+    """Analyzes messages against one KG; results are memoized per query string."""
+
+    def __init__(self, kg: "RestaurantKG", cache_size: int = 1024):
+        self.kg = kg
+        self.analyze = lru_cache(maxsize=cache_size)(self._analyze)
+
+    def _resolve(self, name: Optional[str]) -> Optional[str]:
+        """Map an extracted name to the KG's restaurant name; keep it if nothing matches."""
+        if not name:
+            return name
+        return self.kg.name_resolver.best(name) or name
+
+    def _restaurant_and_section(self, query: str, lower: str) -> Tuple[Optional[str], Optional[str]]:
+        for i, pattern in enumerate(RESTAURANT_SECTION_PATTERNS):
+            match = pattern.search(lower)
+            if match:
+                first = match.group(1).strip() if match.group(1) else None
+                second = match.group(2).strip() if match.group(2) else None
+                if i == 0:
+                    return self._resolve(first), second
+                rest, sect = second, first
+                if sect and len(sect.split()) > 1 and any(w.istitle() for w in sect.split()):
+                    rest, sect = sect, rest
+                return self._resolve(rest), sect
+
+        mentioned = self.kg.name_resolver.mentions(query)
+        if mentioned:
+            section_match = SECTION_PATTERN.search(lower)
+            return mentioned[0], section_match.group(1) if section_match else None
+
+        potential_rests = CAPITALIZED_PATTERN.findall(query)
+        if potential_rests:
+            longest_rest = max(potential_rests, key=len).strip()
+            section_match = re.search(rf"{re.escape(longest_rest)}\s+(dessert|appetizer|main|drink|starter)s?", query, re.IGNORECASE)
+            return self._resolve(longest_rest), section_match.group(1) if section_match else None
+        return None, None
+
+    def _analyze(self, query: str) -> QueryAnalysis:
+        lower = query.lower()
+        kw = _keywords(lower)
+        restaurant, section = self._restaurant_and_section(query, lower)
+        location = _location(query)
+        price_query = None
+        if 'price range' not in lower:
+            price_restaurants = self.kg.name_resolver.mentions(query)
+            # Only a known location counts as a facet; otherwise "at <restaurant>" would filter everything out.
+            facet_location = location if location and self.kg.get_restaurants_in_location(location) else None
+            drop_words = tuple(word for text in price_restaurants[:1] + [facet_location or ''] for word in tokenize(text))
+            vocabulary = self.kg.bm25.term_ids if self.kg.bm25 is not None else None
+            price_query = _price_query(lower, facet_location, drop_words, vocabulary)
+            if price_query:
+                price_restaurant = price_restaurants[0] if price_restaurants else None
+                items = None
+                if price_query.keyword:
+                    # The full answer, so the chatbot does not scan the facet index a second time.
+                    items = self.kg.query_items(
+                        restaurant_name=price_restaurant,
+                        location=price_query.location,
+                        dietary=price_query.dietary,
+                        min_price=price_query.min_price,
+                        max_price=price_query.max_price,
+                        keyword=price_query.keyword,
+                        sort=price_query.sort,
+                        limit=price_query.limit
+                    )
+                # A dish keyword nothing matches means the question was not about prices; leave it to RAG.
+                if items is not None and not items:
+                    price_query = None
+                else:
+                    restaurant = price_restaurant
+                    if items:
+                        price_query = replace(price_query, items=tuple(items))
+
+        if 'compare' in kw and 'menu' in kw and 'and' in kw:
+            intent = 'desc_compare'
+        elif 'vegetarian' in kw and ('best' in kw or 'most' in kw):
+            intent = 'veg_comparison'
+        elif 'price' in kw and 'range' in kw and kw & {'for', 'of', 'at'} and restaurant:
+            intent = 'price_range'
+        elif 'gluten' in kw:
+            specific = kw & {'have', 'offer', 'any', 'at', 'in'} and restaurant
+            intent = 'gluten_free_specific' if specific else 'gluten_free_general'
+        elif price_query:
+            intent = 'price_query'
+        elif 'what' in kw and kw & {'offer', 'have', 'serve'} and kw & {'appetizer', 'dessert', 'dish', 'item'}:
+            intent = 'availability_rag'
+        else:
+            intent = 'general_rag'
+
+        target = None
+        compare_restaurants: Tuple[str, ...] = ()
+        m = COMPARE_MENUS_PATTERN.search(query)
+        if m:
+            compare_restaurants = (m.group(1).strip(), m.group(2).strip())
+        if 'appetizer' in kw and 'offer' in kw:
+            app_intent = 'appetizers'
+            m = APPETIZER_RESTAURANT_PATTERN.search(lower)
+            target = m.group(1) if m else None
+        elif 'vegetarian' in kw and ('best' in kw or 'most' in kw):
+            app_intent = 'veg_comparison'
+        elif 'gluten' in kw:
+            app_intent = 'gluten'
+        elif 'price range' in lower and kw & {'for', 'of', 'at'}:
+            app_intent = 'price_range'
+            m = PRICE_TARGET_PATTERN.search(lower)
+            target = m.group(1).strip() if m else None
+        elif price_query:
+            app_intent = 'price_query'
+        elif 'compare' in kw and ('between' in kw or 'and' in kw) and COMPARE_PATTERN.search(lower):
+            app_intent = 'compare'
+            if not compare_restaurants:
+                m = COMPARE_PATTERN.search(lower)
+                compare_restaurants = (m.group(1).strip(), m.group(2).strip())
+        else:
+            app_intent = 'rag'
+
+        is_menu_query = bool(MENU_PATTERN.search(lower))
+        return QueryAnalysis(
+            query=query,
+            keywords=kw,
+            intent=intent,
+            app_intent=app_intent,
+            restaurant=restaurant,
+            section=section,
+            location=location,
+            dietary=_dietary(lower),
+            is_menu_query=is_menu_query,
+            menu_restaurant=_menu_restaurant(query) if is_menu_query else None,
+            target=target,
+            compare_restaurants=compare_restaurants,
+            compare_keyword=_compare_keyword(query) if intent == 'desc_compare' else None,
+            price_query=price_query
+        )
@@ -0,0 +1,18 @@
+import sys
+from typing import Optional
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB, or None where the platform can't report it."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def format_rss() -> str:
+    rss = peak_rss_mb()
+    return f"peak RSS {rss:.0f} MB" if rss is not None else "peak RSS n/a"
@@ -19,4 +19,17 @@ def parse_price(price_str: str) -> float:
     if not price_str: return 0.0
     # Handle potential ranges like '₹199 - ₹249' -> take the first price
     match = re.search(r'(\d+)', price_str)
-    return float(match.group(1)) if match else 0.0
\ No newline at end of file
+    return float(match.group(1)) if match else 0.0
+
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM token count (~4 characters per token for English menu text)."""
+    return (len(text) + 3) // 4
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens at a word boundary, marking the cut with '…'."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    cut = text[:max(max_tokens * 4 - 1, 0)].rsplit(' ', 1)[0].rstrip(' ,.-')
+    return f"{cut}…" if cut else ""
@@ -1,14 +1,15 @@
 import streamlit as st
 import os
 import sys
-import re
+import time
+from typing import Iterator, Union
 from dotenv import load_dotenv
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
 
 from src.utils.config import load_config
 from src.knowledge_base.kg_builder import RestaurantKG
-from src.chatbot.chatbot import RestaurantChatbot  
+from src.chatbot.chatbot import COMPARE_QUESTION, RestaurantChatbot
 
 
 load_dotenv()
@@ -22,29 +23,68 @@ def load_kg():
     import json
     with open(data_path, 'r') as f:
         data = json.load(f)["data"]
-    return RestaurantKG(data, kg_cache_path="kg_cache")
+    kg = RestaurantKG(
+        data,
+        kg_cache_path="kg_cache",
+        model_name=config.get('embedding_model', 'all-MiniLM-L6-v2'),
+        encoder=config.get('encoder'),
+        index_spec=config.get('kg_index'),
+        query_cache_size=config.get('query_cache_size', 1024),
+        hybrid_search=config.get('hybrid_search', True)
+    )
+    if config.get('kg_warmup', True):
+        kg.warmup(config.get('popular_queries'))
+    return kg
 
 kg = load_kg()
 
 @st.cache_resource
 def load_rag_chatbot():
-    return RestaurantChatbot(kg)
+    return RestaurantChatbot(
+        kg,
+        answer_cache=config.get('answer_cache'),
+        llm_concurrency=config.get('llm_concurrency', 8),
+        kg_workers=config.get('kg_workers', 4),
+        context_token_budget=config.get('context_token_budget', 1500)
+    )
 
 rag_chatbot = load_rag_chatbot()
 
-def answer_query(kg, rag_chatbot, query):
-    q = query.lower()
+def stream_rag_answer(kg, rag_chatbot, query) -> Iterator[str]:
+    """RAG answer streamed token by token, falling back to a simple KG search if nothing comes back."""
+    produced = False
+    try:
+        for chunk in rag_chatbot.ask_stream(query):
+            if chunk.strip():
+                produced = True
+            yield chunk
+    except Exception as e:
+        print(f"RAG fallback error: {e}")
+    if produced:
+        return
+
+    # --- Final fallback: simple KG search ---
+    results = kg.search(query, k=5)
+    if results:
+        yield "Related menu items:\n" + "\n".join(f"- {i['restaurant_name']}: {i['name']} (₹{i['price']:.0f})" for i in results)
+    else:
+        yield "Sorry, I couldn't find an answer for your query."
+
+
+def answer_query(kg, rag_chatbot, query) -> Union[str, Iterator[str]]:
+    """Structured answers come back as a string; LLM answers as a stream of text chunks."""
+    # Parsed once; the chatbot and retriever reuse the memoized analysis.
+    analysis = rag_chatbot.analyzer.analyze(query)
+    route = analysis.app_intent
 
     # --- Structured KG logic ---
-    if "appetizer" in q and "offer" in q:
-        m = re.search(r'does (.+?) offer', q)
-        rest = m.group(1) if m else None
+    if route == "appetizers":
+        rest = analysis.target
         if rest:
+            rest = kg.name_resolver.best(rest) or rest.strip()
             items = [
-                e for e in kg.entities
-                if e['type'] == 'MenuItem'
-                and e['normalized_restaurant_name'] == rest.strip().lower()
-                and ("appetizer" in e['section'].lower() or "appetizer" in e['name'].lower())
+                e for e in kg.get_menu_items_for_restaurant(rest)
+                if "appetizer" in e['section'].lower() or "appetizer" in e['name'].lower()
             ]
             if items:
                 return f"Appetizers at {rest}:\n" + "\n".join(f"- {i['name']} (₹{i['price']:.0f})" for i in items)
@@ -53,7 +93,7 @@ def answer_query(kg, rag_chatbot, query):
         else:
             return "Could not determine the restaurant name from your query."
 
-    if "vegetarian" in q and ("best" in q or "most" in q):
+    if route == "veg_comparison":
         veg_counts = kg.get_veg_counts()
         if not veg_counts: return "No vegetarian options found."
         sorted_veg = sorted(veg_counts.items(), key=lambda item: item[1], reverse=True)
@@ -62,25 +102,13 @@ def answer_query(kg, rag_chatbot, query):
         if sorted_veg: answer += f"\n'{sorted_veg[0][0]}' has the most listed veg items."
         return answer
 
-    if "gluten" in q:
-        gluten_free_items = kg.get_gluten_free_items()
-        if not gluten_free_items: return "No specific gluten-free options found across restaurants based on descriptions."
-        answer = "Some potentially gluten-free options:\n"
-        by_rest = {}
-        for item in gluten_free_items:
-            rest_name = item['restaurant_name']
-            if rest_name not in by_rest: by_rest[rest_name] = []
-            if len(by_rest[rest_name]) < 2: by_rest[rest_name].append(f"{item['name']} (₹{item['price']:.0f})")
-        for rest, items_list in list(by_rest.items())[:4]: answer += f"\n{rest}:\n" + "\n".join([f"• {i}" for i in items_list])
-        if len(by_rest) > 4: answer += f"\n... and potentially more."
-        answer += "\n(Note: Verify with restaurant for strict needs.)"
-        return answer
+    if route == "gluten":
+        return rag_chatbot.gluten_free_answer()
 
-    if "price range" in q and ("for" in q or "of" in q or "at" in q):
-        m = re.search(r'price range (?:for|of|at) (.+)', q)
-        target = m.group(1).strip() if m else None
+    if route == "price_range":
+        target = analysis.target
         if target:
-            rest_price = kg.get_price_range(target)
+            rest_price = kg.get_price_range(kg.name_resolver.best(target) or target)
             if "Could not find restaurant" in rest_price or "no valid price information" in rest_price.lower():
                 results = [e for e in kg.entities if e['type'] == 'MenuItem' and target.lower() in e['name'].lower()]
                 prices = [e['price'] for e in results if e['price'] > 0]
@@ -104,22 +132,24 @@ def answer_query(kg, rag_chatbot, query):
         else:
             return "Could not determine the restaurant or item name for price range."
 
+    # --- Structured price/facet queries ("cheapest rolls at Faasos", "veg items under ₹200") ---
+    if route == "price_query":
+        return rag_chatbot.answer_price_query(analysis)
+
     # --- RAG-powered Comparison logic ---
-    if "compare" in q and ("between" in q or "and" in q):
-        m = re.search(r'compare (?:between )?(.+?) and (.+)', q)
-        if m:
-            rest1 = m.group(1).strip()
-            rest2 = m.group(2).strip()
-            # Retrieve top menu/context for both restaurants
+    if route == "compare":
+        if analysis.compare_restaurants:
+            rest1, rest2 = analysis.compare_restaurants
+            # Resolve both names (typos, slugs, partial names) and retrieve their menus
+            match1 = kg.name_resolver.best(rest1)
+            match2 = kg.name_resolver.best(rest2)
             context1 = "\n".join(
                 f"{e['name']} ({e['section']}, ₹{e['price']:.0f})"
-                for e in kg.entities
-                if e['type'] == 'MenuItem' and rest1.lower() in e['normalized_restaurant_name']
+                for e in (kg.get_menu_items_for_restaurant(match1) if match1 else [])
             )[:1500]
             context2 = "\n".join(
                 f"{e['name']} ({e['section']}, ₹{e['price']:.0f})"
-                for e in kg.entities
-                if e['type'] == 'MenuItem' and rest2.lower() in e['normalized_restaurant_name']
+                for e in (kg.get_menu_items_for_restaurant(match2) if match2 else [])
             )[:1500]
             if not context1 and not context2:
                 return f"Sorry, I couldn't find data for either '{rest1}' or '{rest2}'."
@@ -127,32 +157,21 @@ def answer_query(kg, rag_chatbot, query):
                 return f"Sorry, I couldn't find data for '{rest1}'."
             if not context2:
                 return f"Sorry, I couldn't find data for '{rest2}'."
-            # Compose a comparison prompt for RAG
-            compare_prompt = (
-                f"Compare the following two restaurants based on their menu, price range, and variety. "
-                f"Highlight unique items and similarities.\n\n"
-                f"{rest1.title()} Menu:\n{context1}\n\n"
-                f"{rest2.title()} Menu:\n{context2}\n"
-            )
-            rag_response = rag_chatbot.ask(compare_prompt)
+            # Both menus go straight to the LLM as context; no second routing / retrieval pass.
+            try:
+                rag_response = rag_chatbot.ask_with_context(
+                    COMPARE_QUESTION, rag_chatbot.comparison_context(rest1, rest2, context1, context2)
+                )
+            except Exception as e:
+                print(f"Comparison error: {e}")
+                rag_response = ""
             if rag_response and rag_response.strip():
                 return rag_response
             else:
                 return "Sorry, I couldn't generate a comparison at this time."
 
     # --- Fallback: RAG-based semantic search ---
-    try:
-        rag_response = rag_chatbot.ask(query)
-        if rag_response and rag_response.strip():
-            return rag_response
-    except Exception as e:
-        print(f"RAG fallback error: {e}")
-
-    # --- Final fallback: simple KG search ---
-    results = kg.search(query, k=5)
-    if results:
-        return "Related menu items:\n" + "\n".join(f"- {i['restaurant_name']}: {i['name']} (₹{i['price']:.0f})" for i in results)
-    return "Sorry, I couldn't find an answer for your query."
+    return stream_rag_answer(kg, rag_chatbot, query)
 # --- Streamlit UI (unchanged) ---
 st.markdown(
     """
@@ -186,6 +205,11 @@ Feel free to ask me anything about the restaurants in our database!
 with st.sidebar:
     st.title('🤖RestroBot: Your Local Restaurant Guide')
     st.markdown(side_bar_message)
+    cache_stats = rag_chatbot.answer_cache_stats()
+    st.caption(
+        f"Answer cache: {cache_stats['hit_rate']:.0%} hit rate, "
+        f"{cache_stats['saved_llm_seconds']:.1f}s of LLM time saved"
+    )
 
 initial_message = """
     Hi there! I'm your RestroBot 🤖
@@ -215,10 +239,20 @@ if prompt := st.chat_input():
 
 if st.session_state.messages[-1]["role"] != "assistant":
     with st.chat_message("assistant"):
+        placeholder = st.empty()
+        start = time.perf_counter()
+        # The spinner only covers routing, retrieval and the wait for the first token.
         with st.spinner("Finding the best food recommendations for you..."):
             response = answer_query(kg, rag_chatbot, prompt)
-            placeholder = st.empty()
-            full_response = response
-            placeholder.markdown(full_response)
+            chunks = iter([response]) if isinstance(response, str) else response
+            full_response = next(chunks, "")
+        first_token_seconds = time.perf_counter() - start
+        placeholder.markdown(full_response)
+        for chunk in chunks:
+            full_response += chunk
+            placeholder.markdown(full_response + "▌")
+        placeholder.markdown(full_response)
+        print(f"Answer: first token in {first_token_seconds:.2f}s, complete in {time.perf_counter() - start:.2f}s.")
+        st.caption(f"First token in {first_token_seconds:.2f}s")
     message = {"role": "assistant", "content": full_response}
     st.session_state.messages.append(message)
\ No newline at end of file
@@ -0,0 +1,78 @@
+import sys
+import types
+import zlib
+
+import numpy as np
+import pytest
+
+from src.knowledge_base.kg_builder import RestaurantKG
+from src.retrieval.kg_retriever import KGRetriever
+
+DIMENSION = 32
+
+
+class FakeSentenceTransformer:
+    """Deterministic bag-of-words embedder so the KG can be built without downloading a model."""
+
+    def __init__(self, model_name, device=None, **kwargs):
+        self.device = types.SimpleNamespace(type='cpu')
+
+    def get_sentence_embedding_dimension(self):
+        return DIMENSION
+
+    def encode(self, texts, **kwargs):
+        vectors = np.zeros((len(texts), DIMENSION), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, zlib.crc32(word.encode('utf-8')) % DIMENSION] += 1.0
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-6)
+
+
+def _restaurant(name, items):
+    return {
+        'restaurant_name': name,
+        'veg': [{'section': 'Starters', 'items': [
+            {'name': item, 'price': '₹199', 'description': f'{item.lower()} with mint chutney', 'is_nonveg': False}
+            for item in items
+        ]}],
+        'non_veg': []
+    }
+
+
+@pytest.fixture
+def kg(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'sentence_transformers', types.SimpleNamespace(SentenceTransformer=FakeSentenceTransformer))
+    monkeypatch.setitem(sys.modules, 'torch', types.ModuleType('torch'))
+    data = {
+        'spice-hub_lucknow_hazratganj': _restaurant('spice-hub', ['Spicy Paneer Tikka', 'Masala Corn']),
+        'spice-hub_lucknow_gomti-nagar': _restaurant('spice-hub', ['Spicy Paneer Tikka', 'Masala Corn']),
+        'curry-house_lucknow_gomti-nagar': _restaurant('curry-house', ['Spicy Paneer Roll', 'Jeera Aloo']),
+    }
+    return RestaurantKG(data, kg_cache_path=str(tmp_path / 'kg_cache'))
+
+
+def test_retrieve_many_applies_location_filter(kg):
+    retriever = KGRetriever(kg=kg, k=5)
+    queries = ['spicy paneer in Hazratganj', 'spicy paneer']
+
+    batched = retriever.retrieve_many(queries)
+
+    assert len(batched) == 2
+    filtered = [doc.page_content for doc in batched[0]]
+    assert filtered and all('Hazratganj' in content and 'Gomti' not in content for content in filtered)
+    assert batched[1]
+    for query, docs in zip(queries, batched):
+        assert [doc.page_content for doc in docs] == [doc.page_content for doc in retriever.invoke(query)]
+
+
+def test_build_documents_packs_repeated_items_once(kg):
+    retriever = KGRetriever(kg=kg, k=5)
+    item = {'restaurant_name': 'spice-hub', 'location': 'Lucknow Hazratganj', 'name': 'Masala Corn',
+            'section': 'Starters', 'price': 199.0, 'dietary': 'veg', 'description': 'masala corn'}
+    items = [item, dict(item, section='Combos', id='combo'), dict(item, price=249.0)]
+
+    documents = retriever._build_documents(items)
+
+    assert len(documents) == 1
+    assert documents[0].metadata['item_names'] == ['Masala Corn', 'Masala Corn']
+    assert documents[0].page_content.count('Masala Corn') == 2